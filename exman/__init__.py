@@ -1,6 +1,8 @@
 from .parser import ExParser, simpleroot, optional, ArgumentError
-from .index import Index
+from .index import Index, MultiIndex
 from . import index
 from . import parser
+from . import pack
+from . import storage
 
 __version__ = "0.1.9"
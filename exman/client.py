@@ -0,0 +1,55 @@
+import json
+import urllib.error
+import urllib.request
+
+__all__ = ["Client"]
+
+
+class Client(object):
+    """
+    Client of `exman serve`. Keeps a local copy of raw records and transfers
+    only runs that are new or changed since the last call, removed runs are dropped.
+    """
+
+    def __init__(self, url, timeout=30):
+        self.url = url.rstrip("/")
+        self.timeout = timeout
+        self._records = {}
+        self._etag = None
+        # "<token>-<generation>" of the server the records are up to
+        self._generation = None
+
+    def _get(self, path, etag=None):
+        request = urllib.request.Request(self.url + path)
+        if etag is not None:
+            request.add_header("If-None-Match", etag)
+        try:
+            with urllib.request.urlopen(request, timeout=self.timeout) as response:
+                return json.loads(response.read().decode()), response.headers
+        except urllib.error.HTTPError as e:
+            if e.code == 304:
+                return None, e.headers
+            raise
+
+    def records(self):
+        ids, headers = self._get("/ids", self._etag)
+        if ids is None:
+            return list(self._records.values())
+        etag = headers["ETag"]
+        ids = set(ids)
+        for run_id in set(self._records) - ids:
+            del self._records[run_id]
+        since_gen = 0
+        if self._generation is not None:
+            token, generation = self._generation.rsplit("-", 1)
+            if headers["X-Exman-Generation"].startswith(token + "-"):
+                since_gen = int(generation)
+        # new runs and runs with changed status or resources
+        records, headers = self._get("/runs?since_gen={}".format(since_gen))
+        if since_gen == 0:
+            # the server was restarted, generations are not comparable
+            self._records = {}
+        self._records.update((int(r["id"]), r) for r in records)
+        self._generation = headers["X-Exman-Generation"]
+        self._etag = etag
+        return list(self._records.values())
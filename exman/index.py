@@ -1,13 +1,22 @@
-import configargparse
 import pandas as pd
+import numpy as np
 import strconv
 import json
 import functools
 import datetime
 import joblib
+import os
+import pathlib
+import zipfile
+import collections
+import itertools
+import asyncio
+import concurrent.futures
 from . import parser
+from . import pack
+from .storage import POSIX
 
-__all__ = ["Index"]
+__all__ = ["Index", "MultiIndex"]
 
 
 def only_value_error(conv):
@@ -45,45 +54,704 @@ converter = strconv.Strconv(
 )
 
 
+def compact_frame(df, category_ratio=0.5, sparse_ratio=0.5):
+    """
+    Reduce memory footprint of the frame returned by `Index.info`:
+    repeated strings become categoricals, numbers are downcast if it is lossless
+    and mostly missing object columns become sparse.
+    """
+    columns = {}
+    for name, col in df.items():
+        if pd.api.types.is_bool_dtype(col):
+            columns[name] = col
+        elif pd.api.types.is_integer_dtype(col):
+            columns[name] = pd.to_numeric(col, downcast="integer")
+        elif pd.api.types.is_float_dtype(col):
+            downcast = col.astype(np.float32)
+            if (downcast.astype(col.dtype) == col)[col.notna()].all():
+                columns[name] = downcast
+            else:
+                columns[name] = col
+        elif col.dtype == object and len(col):
+            values = col.dropna()
+            if len(values) <= len(col) * (1 - sparse_ratio):
+                columns[name] = col.astype(pd.SparseDtype(object, np.nan))
+            elif all(isinstance(v, str) for v in values) and (
+                values.nunique() <= len(col) * category_ratio
+            ):
+                columns[name] = col.astype("category")
+            else:
+                columns[name] = col
+        else:
+            columns[name] = col
+    return pd.DataFrame(columns, index=df.index)
+
+
+def convert_column(col):
+    if any(isinstance(v, str) for v in converter.convert_series(col)):
+        return col
+    else:
+        return pd.Series(converter.convert_series(col), name=col.name, index=col.index)
+
+
+def _converted_frame(records, order, raw=()):
+    """Frame of records with columns converted, except for `raw` ones"""
+    df = pd.DataFrame.from_records(records)
+    return (
+        df.apply(lambda s: s if s.name in raw else convert_column(s))
+        .sort_values(order)
+        .reset_index(drop=True)
+    )
+
+
+def _with_roots(df, bases, compact):
+    """Make `root` absolute paths given per row base directories, or compact"""
+    if compact:
+        df = compact_frame(df.assign(root=df.root.astype(str)))
+    else:
+        df = df.assign(root=[base / root for base, root in zip(bases, df.root)])
+        if pack.SEGMENT_KEY in df.columns:
+            df[pack.SEGMENT_KEY] = [
+                base / segment if isinstance(segment, str) else segment
+                for base, segment in zip(bases, df[pack.SEGMENT_KEY])
+            ]
+    cols = df.columns.tolist()
+    cols.insert(0, cols.pop(cols.index("id")))
+    return df.reindex(columns=cols)
+
+
+def read_raw(cfg, storage=POSIX):
+    """
+    Content of params file and of `parser.RUN_EXTRA_FILES` found near it,
+    and the run directory relative to the exman root
+    """
+    cfg = pathlib.Path(cfg)
+    params = storage.read_text(cfg)
+    run = storage.resolve(cfg).parent
+    extra = {}
+    for name in parser.RUN_EXTRA_FILES:
+        try:
+            extra[name] = storage.read_text(run / name)
+        except FileNotFoundError:
+            pass
+    return params, extra, pathlib.Path(run.parent.name, run.name)
+
+
+def parse_batch(raw, errors="raise"):
+    return [parser.check_record(*args, errors=errors) for args in raw]
+
+
+def read_record(cfg, storage=POSIX, errors="raise"):
+    return parser.check_record(*read_raw(cfg, storage), errors=errors)
+
+
+def read_records(cfgs, storage=POSIX, errors="raise"):
+    return [read_record(cfg, storage, errors) for cfg in cfgs]
+
+
+def _flatten(chunks):
+    """Records from lists returned by read tasks, skipped ones are dropped"""
+    return [record for chunk in chunks for record in chunk if record is not None]
+
+
+class Summary(object):
+    """Value counts of raw records per column, supports adding and removing records"""
+
+    # columns with at most this number of distinct values get value counts
+    LOW_CARDINALITY = 20
+
+    def __init__(self):
+        self.total = 0
+        self.columns = collections.defaultdict(collections.Counter)
+
+    @staticmethod
+    def _key(value):
+        return value if isinstance(value, str) else json.dumps(value)
+
+    def add(self, record):
+        self.total += 1
+        for column, value in record.items():
+            if value is not None:
+                self.columns[column][self._key(value)] += 1
+
+    def remove(self, record):
+        self.total -= 1
+        for column, value in record.items():
+            if value is not None:
+                counts = self.columns[column]
+                counts[self._key(value)] -= 1
+                if not counts[self._key(value)]:
+                    del counts[self._key(value)]
+                if not counts:
+                    del self.columns[column]
+
+    def describe(self):
+        rows = []
+        for column in sorted(self.columns):
+            counts = self.columns[column]
+            count = sum(counts.values())
+            typed = list(converter.convert_series(list(counts)))
+            try:
+                low, high = min(typed), max(typed)
+            except TypeError:
+                low = high = None
+            rows.append(
+                dict(
+                    column=column,
+                    count=count,
+                    missing=self.total - count,
+                    distinct=len(counts),
+                    min=low,
+                    max=high,
+                    values=(
+                        dict(counts) if len(counts) <= self.LOW_CARDINALITY else None
+                    ),
+                )
+            )
+        return pd.DataFrame.from_records(
+            rows,
+            columns=["column", "count", "missing", "distinct", "min", "max", "values"],
+        ).set_index("column")
+
+    def varying(self, ignore=(), ignore_prefixes=()):
+        return [
+            column
+            for column, counts in sorted(self.columns.items())
+            if column not in ignore
+            and not column.startswith(tuple(ignore_prefixes))
+            and len(counts) + (sum(counts.values()) < self.total) > 1
+        ]
+
+
+# states that never change once written
+FINAL_STATES = {"finished", "failed", "interrupted"}
+SUMMARY_VERSION = 1
+
+
+def _read_if_exists(cfg, storage, errors):
+    try:
+        return read_record(cfg, storage, errors)
+    except FileNotFoundError:
+        # deleted meanwhile
+        return None
+
+
 class Index(parser.ExmanDirectory):
-    def __init__(self, root):
-        super().__init__(root, mode="validate")
+    def __init__(self, root, server=None, storage=None):
+        super().__init__(root, mode="validate", storage=storage)
+        self._cache = {}
+        # generation at which the cached record was read last time
+        self._changed = {}
+        self._summary = Summary()
+        self._summary_loaded = False
+        # segments seen by refresh, runs packed into new ones are read again
+        self._segments = set()
+        self.generation = 0
+        if server is None:
+            self.client = None
+        else:
+            from . import client
 
-    def info(self, source=None, *, njobs=1):
-        if source is None:
-            source = self.index
-            files = source.iterdir()
+            self.client = client.Client(server)
+
+    @property
+    def summary_file(self):
+        return self.root / parser.SUMMARY_FILE
+
+    def refresh(self, errors="skip", njobs=1):
+        """
+        Incrementally update cached records of the index: only new index entries
+        are read, removed ones are dropped and statuses of alive runs are updated.
+        The first call starts from the summary file saved by earlier refreshes,
+        changes are saved back to it.
+        Returns True if anything has changed, `generation` is increased then.
+        Broken params files are handled according to `errors`, see `info`.
+        """
+        loaded = False
+        if not self._summary_loaded:
+            self._summary_loaded = True
+            loaded = self._load_summary()
+        changed = self._refresh_segments()
+        entries = {name: self.index / name for name in self.storage.listdir(self.index)}
+        for name in set(self._cache) - set(entries):
+            self._uncache(name)
+            changed = True
+        plain = []
+        packed = collections.defaultdict(list)
+        for name, cfg in entries.items():
+            if name in self._cache:
+                if self._refresh_status(name, cfg, errors):
+                    changed = True
+                continue
+            run = pack.packed_run(cfg, self.storage)
+            if run is None:
+                plain.append((name, cfg))
+            else:
+                packed[run.segment].append(name)
+        records = joblib.Parallel(n_jobs=njobs)(
+            joblib.delayed(_read_if_exists)(cfg, self.storage, errors)
+            for _, cfg in plain
+        )
+        for (name, _), record in zip(plain, records):
+            if record is not None:
+                self._recache(name, record)
+                changed = True
+        for segment, names in packed.items():
+            runs = [name[: -len(parser.EXT) - 1] for name in names]
+            records = pack.read_segment_params(segment, runs, errors)
+            for name, record in zip(names, records):
+                if record is not None:
+                    self._recache(name, record)
+                    changed = True
+        if changed:
+            self._save_summary()
+        if changed or loaded:
+            self.generation += 1
+        return changed or loaded
+
+    def _refresh_segments(self):
+        if not self.storage.exists(self.packs):
+            return False
+        segments = set(self.storage.listdir(self.packs))
+        ids = set()
+        for segment in segments - self._segments:
+            match = parser.SEGMENT_PATTERN.match(segment)
+            if match is not None:
+                ids.update(
+                    range(int(match.group("first")), int(match.group("last")) + 1)
+                )
+        self._segments = segments
+        packed = [
+            name for name, record in self._cache.items() if int(record["id"]) in ids
+        ]
+        for name in packed:
+            self._uncache(name)
+        return bool(packed)
+
+    def _load_summary(self):
+        try:
+            state = json.loads(self.storage.read_text(self.summary_file))
+        except (FileNotFoundError, ValueError):
+            return False
+        if state.get("version") != SUMMARY_VERSION:
+            return False
+        self._cache = state["runs"]
+        self._segments = set(state.get("segments", ()))
+        self._changed = {name: self.generation + 1 for name in self._cache}
+        self._summary.total = state["total"]
+        for column, counts in state["columns"].items():
+            self._summary.columns[column].update(counts)
+        return True
+
+    def _save_summary(self):
+        state = dict(
+            version=SUMMARY_VERSION,
+            total=self._summary.total,
+            columns=self._summary.columns,
+            runs=self._cache,
+            segments=sorted(self._segments),
+        )
+        try:
+            with self.permissions_context():
+                self.storage.write_text(self.summary_file, json.dumps(state))
+        except OSError:
+            # read only root, the summary is kept in memory only
+            pass
+
+    def _refresh_status(self, name, cfg, errors):
+        record = self._cache[name]
+        status = record.get("status")
+        if status in FINAL_STATES:
+            return False
+        if status is None:
+            # runs without status file are rechecked only while they are young,
+            # SafeExperiment may be entered later than the run is created
+            parsed = parser.parse_dir_name(name)
+            young = datetime.timedelta(
+                seconds=parser.HEARTBEAT_INTERVAL * parser.HEARTBEAT_STALE
+            )
+            if parsed is None or datetime.datetime.now() - parsed.time > young:
+                return False
+        run = pack.packed_run(cfg, self.storage)
+        if run is not None:
+            # packed runs are not alive anymore
+            return False
+        if pack.run_status(self.storage.resolve(cfg).parent, self.storage) == status:
+            return False
+        # resources and other extra files are written with the final status
+        record = read_record(cfg, self.storage, errors)
+        if record is None:
+            self._uncache(name)
         else:
-            source = self.marked / source
-            files = source.glob("**/*/" + parser.PARAMS_FILE)
+            self._recache(name, record)
+        return True
+
+    def _uncache(self, name):
+        record = self._cache.pop(name)
+        del self._changed[name]
+        self._summary.remove(record)
+
+    def _recache(self, name, record):
+        if name in self._cache:
+            self._uncache(name)
+        self._cache[name] = record
+        # refresh increases generation once it is done
+        self._changed[name] = self.generation + 1
+        self._summary.add(record)
+
+    def describe(self, njobs=1):
+        """
+        Per column summary of the index: count, missing, distinct, min, max and
+        value counts for low cardinality columns. Summaries are updated
+        incrementally together with the cache and saved to `summary_file`,
+        a new Index reads only runs added since then.
+        """
+        self.refresh(njobs=njobs)
+        return self._summary.describe()
 
-        yaml = configargparse.YAMLConfigFileParser()
+    def varying_columns(
+        self,
+        ignore=("id", "time", "root", "status", parser.HASH_KEY, pack.SEGMENT_KEY),
+        ignore_prefixes=(parser.RESOURCES_PREFIX,),
+        njobs=1,
+    ):
+        """
+        Parameters having more than one value (missing counts as a value),
+        run specific columns such as status and resource usage are ignored
+        """
+        self.refresh(njobs=njobs)
+        return self._summary.varying(ignore, ignore_prefixes)
 
-        def get_dict(cfg):
-            return yaml.parse(cfg.open("r"))
+    def records(self, since_id=None, refresh=True, errors="skip", since_gen=None):
+        """
+        Cached raw records of the index, with `since_id` only newer runs,
+        with `since_gen` only records read after that `generation`
+        """
+        if refresh:
+            self.refresh(errors)
+        return [
+            record
+            for name, record in self._cache.items()
+            if (since_id is None or int(record["id"]) > since_id)
+            and (since_gen is None or self._changed[name] > since_gen)
+        ]
 
-        def convert_column(col):
-            if any(isinstance(v, str) for v in converter.convert_series(col)):
-                return col
+    def _sources(self, source):
+        """
+        Split the runs of the index or a mark into params files of plain runs
+        and run names grouped by packed segment.
+        """
+        if source is None:
+            files = [self.index / name for name in self.storage.listdir(self.index)]
+        else:
+            files = self._marked_files(self.marked / source)
+        plain = []
+        packed = collections.defaultdict(list)
+        for cfg in files:
+            run = pack.packed_run(cfg, self.storage)
+            if run is None:
+                plain.append(cfg)
             else:
-                return pd.Series(
-                    converter.convert_series(col), name=col.name, index=col.index
+                packed[run.segment].append(run.name)
+        return plain, packed
+
+    def _frame(self, records, compact=False):
+        df = _converted_frame(records, ["id"])
+        return _with_roots(df, pd.Series(self.root, index=df.index), compact)
+
+    def info(self, source=None, *, njobs=1, compact=False, cached=False, errors="skip"):
+        """
+        Load runs into a frame, `source` is a mark to load instead of the whole index.
+        `status` column is the state of the run from its heartbeat file.
+        With `cached=True` (or a `server`) only changes since the last call are read.
+        With `compact=True` the frame is passed through `compact_frame` and `root`
+        is kept as relative string, use `Index.path` to get the directory.
+        Packed runs have `pack.SEGMENT_KEY` column with their segment, their `root`
+        does not exist anymore, read their files with `read_file`.
+        Runs with half-written params files are skipped with a warning, `errors`
+        is "raise" to fail instead or "repair" to recover them from directory names.
+        """
+        return self._frame(
+            self.raw_records(source, njobs=njobs, cached=cached, errors=errors),
+            compact,
+        )
+
+    def raw_records(self, source=None, *, njobs=1, cached=False, errors="skip"):
+        """Parsed but not converted params of runs, see `info`"""
+        if source is None and self.client is not None:
+            return self.client.records()
+        if source is None and cached:
+            return self.records(errors=errors)
+        try:
+            return _flatten(
+                joblib.Parallel(n_jobs=njobs)(self._read_tasks(source, errors))
+            )
+        except FileNotFoundError as e:
+            raise KeyError(source) from e
+
+    def _read_tasks(self, source, errors):
+        """joblib tasks reading records of the source, each returns a list"""
+        plain, packed = self._sources(source)
+        return [
+            joblib.delayed(read_records)([c], self.storage, errors) for c in plain
+        ] + [
+            joblib.delayed(pack.read_segment_params)(segment, names, errors)
+            for segment, names in packed.items()
+        ]
+
+    async def ainfo(
+        self,
+        source=None,
+        *,
+        concurrency=64,
+        batch_size=1024,
+        compact=False,
+        errors="skip",
+    ):
+        """
+        Same as `info` for high latency filesystems. Up to `concurrency` files
+        are read at the same time, parsing is done in batches of `batch_size`.
+        """
+        loop = asyncio.get_event_loop()
+        with concurrent.futures.ThreadPoolExecutor(concurrency) as executor:
+            try:
+                plain, packed = await loop.run_in_executor(
+                    executor, self._sources, source
+                )
+                raw = await asyncio.gather(
+                    *(
+                        loop.run_in_executor(executor, read_raw, c, self.storage)
+                        for c in plain
+                    )
+                )
+                packed_records = await asyncio.gather(
+                    *(
+                        loop.run_in_executor(
+                            executor, pack.read_segment_params, segment, names, errors
+                        )
+                        for segment, names in packed.items()
+                    )
                 )
+            except FileNotFoundError as e:
+                raise KeyError(source) from e
+            records = []
+            for i in range(0, len(raw), batch_size):
+                records.extend(
+                    await loop.run_in_executor(
+                        executor, parse_batch, raw[i : i + batch_size], errors
+                    )
+                )
+        records.extend(itertools.chain.from_iterable(packed_records))
+        return self._frame([r for r in records if r is not None], compact)
 
-        records = joblib.Parallel(n_jobs=njobs)(
-            (joblib.delayed(get_dict)(c) for c in files)
+    def list_runs(
+        self,
+        *,
+        since=None,
+        until=None,
+        min_id=None,
+        max_id=None,
+        states=("run", "tmp", "fail"),
+        status=False,
+    ):
+        """
+        Table of id, time, tag, state and name of runs built from directory names
+        only, no params are read. Packed runs are listed with `"pack"` in states,
+        that requires reading the segment indices. With `status=True` heartbeat
+        files are read to add the `status` column.
+        """
+        directories = {"run": self.runs, "tmp": self.tmp, "fail": self.fails}
+        unknown = set(states) - set(directories) - {"pack"}
+        if unknown:
+            raise ValueError("Unknown states: {}".format(unknown))
+
+        def id_ok(num):
+            return (min_id is None or num >= min_id) and (
+                max_id is None or num <= max_id
+            )
+
+        def time_ok(time):
+            return (since is None or time >= since) and (until is None or time <= until)
+
+        def runs():
+            for state in states:
+                if state == "pack":
+                    for run in self._packed_runs(min_id, max_id):
+                        yield state, run
+                else:
+                    directory = directories[state]
+                    for name in self.storage.listdir(directory):
+                        yield state, directory / name
+
+        columns = ["id", "time", "tag", "state", "name"]
+        if status:
+            columns.append("status")
+        rows = []
+        for state, run in runs():
+            parsed = parser.parse_dir_name(run.name)
+            if parsed is not None and id_ok(parsed.num) and time_ok(parsed.time):
+                row = (parsed.num, parsed.time, parsed.tag, state, run.name)
+                if status:
+                    row += (pack.run_status(run, self.storage),)
+                rows.append(row)
+        return (
+            pd.DataFrame.from_records(rows, columns=columns)
+            .sort_values("id")
+            .reset_index(drop=True)
         )
 
+    def _packed_runs(self, min_id=None, max_id=None):
+        if not self.storage.exists(self.packs):
+            return
+        for segment in sorted(os.scandir(str(self.packs)), key=lambda e: e.name):
+            match = parser.SEGMENT_PATTERN.match(segment.name)
+            if not match:
+                continue
+            if max_id is not None and int(match.group("first")) > max_id:
+                continue
+            if min_id is not None and int(match.group("last")) < min_id:
+                continue
+            with zipfile.ZipFile(segment.path) as zf:
+                names = sorted({n.split("/", 1)[0] for n in zf.namelist()})
+            for name in names:
+                yield pack.PackedRun(segment.path, name)
+
+    def read_log(self, run_id, last_n=None):
+        """
+        Log of the run, rotated and compressed segments included.
+        With `last_n` only the last lines are read, seeking from the end.
+        """
+        run = self.locate(run_id)
+        if isinstance(run, pack.PackedRun):
+            return run.read_log(last_n)
+        return parser.read_run_log(run, last_n, self.storage)
+
+    def path(self, root):
+        return self.root / root
+
+    def _marked_files(self, source):
+        if not self.storage.exists(source):
+            raise KeyError(source.name)
+        for name in sorted(self.storage.listdir(source)):
+            path = source / name
+            if parser.DIR_PATTERN.match(name):
+                if pack.packed_run(path, self.storage) is not None:
+                    yield path
+                elif self.storage.exists(path / parser.PARAMS_FILE):
+                    yield path / parser.PARAMS_FILE
+            # symlinks to runs are not followed, like os.walk does
+            if self.storage.is_dir(path) and not self.storage.is_symlink(path):
+                yield from self._marked_files(path)
+
+    def locate(self, run_id):
+        """
+        Find the run by id, returns its directory or `pack.PackedRun` for packed runs.
+        """
         try:
-            df = (
-                pd.DataFrame.from_records(records)
-                .apply(lambda s: convert_column(s))
-                .sort_values("id")
-                .assign(root=lambda _: _.root.apply(self.root.__truediv__))
-                .reset_index(drop=True)
+            return self.find_run(run_id)
+        except KeyError:
+            pass
+        for run in self._packed_runs(run_id, run_id):
+            parsed = parser.parse_dir_name(run.name)
+            if parsed is not None and parsed.num == run_id:
+                return run
+        raise KeyError(run_id)
+
+    def read_file(self, run_id, filename=parser.PARAMS_FILE, binary=False):
+        run = self.locate(run_id)
+        if isinstance(run, pack.PackedRun):
+            data = run.read_bytes(filename)
+        else:
+            with self.storage.open_binary(run / filename) as f:
+                data = f.read()
+        return data if binary else data.decode()
+
+
+class MultiIndex(object):
+    """
+    Several exman roots queried as one table. Roots are given as a list or as
+    `{label: root}`, runs are labeled with `root_label` column. Records of all
+    roots are converted together, so column types agree between roots.
+    """
+
+    def __init__(self, roots, njobs=-1):
+        if not isinstance(roots, dict):
+            roots = collections.OrderedDict((str(root), root) for root in roots)
+        if not roots:
+            raise ValueError("At least one root is required")
+        self.indices = collections.OrderedDict(
+            (label, root if isinstance(root, Index) else Index(root))
+            for label, root in roots.items()
+        )
+        self.njobs = njobs
+
+    def _parallel(self, call):
+        # threads share Index objects, so caches of every root are reused
+        return joblib.Parallel(n_jobs=self.njobs, prefer="threads")(
+            joblib.delayed(call)(index) for index in self.indices.values()
+        )
+
+    def _read(self, source, errors):
+        """
+        Records of every root read from scratch. Roots are listed in threads,
+        parsing is cpu bound, so files of all roots are parsed in one process pool.
+        """
+
+        def tasks(index):
+            if source is None and index.client is not None:
+                return None
+            return index._read_tasks(source, errors)
+
+        try:
+            per_root = self._parallel(tasks)
+            results = iter(
+                joblib.Parallel(n_jobs=self.njobs)(
+                    itertools.chain.from_iterable(filter(None, per_root))
+                )
             )
-            cols = df.columns.tolist()
-            cols.insert(0, cols.pop(cols.index("id")))
-            return df.reindex(columns=cols)
         except FileNotFoundError as e:
-            raise KeyError(source.name) from e
+            raise KeyError(source) from e
+        return [
+            (
+                index.raw_records(errors=errors)
+                if root_tasks is None
+                else _flatten(itertools.islice(results, len(root_tasks)))
+            )
+            for index, root_tasks in zip(self.indices.values(), per_root)
+        ]
+
+    def info(self, source=None, *, compact=False, cached=True, errors="skip"):
+        """Same as `Index.info` for all roots, `cached` is on by default"""
+        if cached:
+            per_root = self._parallel(
+                lambda index: index.raw_records(source, cached=True, errors=errors)
+            )
+        else:
+            per_root = self._read(source, errors)
+        # labels are kept as given, position keeps the order of roots
+        records = [
+            dict(record, root_label=label, _root_pos=i)
+            for i, (label, root_records) in enumerate(zip(self.indices, per_root))
+            for record in root_records
+        ]
+        df = _converted_frame(
+            records, ["_root_pos", "id"], raw=("root_label", "_root_pos")
+        )
+        bases = df.pop("_root_pos").map(
+            dict(enumerate(index.root for index in self.indices.values()))
+        )
+        df = _with_roots(df, bases, compact)
+        cols = df.columns.tolist()
+        cols.insert(0, cols.pop(cols.index("root_label")))
+        return df.reindex(columns=cols)
+
+    def list_runs(self, **kwargs):
+        """Same as `Index.list_runs` for all roots"""
+        per_root = self._parallel(lambda index: index.list_runs(**kwargs))
+        return pd.concat(
+            [
+                runs.assign(root_label=label)
+                for label, runs in zip(self.indices, per_root)
+            ],
+            ignore_index=True,
+        ).reindex(columns=["root_label"] + per_root[0].columns.tolist())
@@ -0,0 +1,216 @@
+import collections
+import datetime
+import os
+import pathlib
+import shutil
+import tempfile
+import zipfile
+from . import parser
+from .storage import POSIX, PosixStorage
+
+__all__ = [
+    "PackedRun",
+    "pack_runs",
+    "packed_run",
+    "read_segment_params",
+    "run_status",
+]
+
+
+# record column with the segment of a packed run, relative to the exman root
+SEGMENT_KEY = "pack_segment"
+
+
+class PackedRun(object):
+    """
+    Run stored in an archive segment. Segments are zip files, the central directory
+    of zip is the offset index, so any file of any run is read without unpacking.
+    """
+
+    def __init__(self, segment, name):
+        self.segment = pathlib.Path(segment)
+        self.name = name
+
+    def __repr__(self):
+        return "PackedRun({!r}, {!r})".format(str(self.segment), self.name)
+
+    def member(self, filename):
+        return "{}/{}".format(self.name, pathlib.PurePosixPath(filename))
+
+    def namelist(self):
+        prefix = self.name + "/"
+        with zipfile.ZipFile(str(self.segment)) as zf:
+            return [n[len(prefix) :] for n in zf.namelist() if n.startswith(prefix)]
+
+    def exists(self, filename):
+        with zipfile.ZipFile(str(self.segment)) as zf:
+            try:
+                zf.getinfo(self.member(filename))
+            except KeyError:
+                return False
+            return True
+
+    def read_bytes(self, filename):
+        with zipfile.ZipFile(str(self.segment)) as zf:
+            try:
+                return zf.read(self.member(filename))
+            except KeyError as e:
+                raise FileNotFoundError(self.member(filename)) from e
+
+    def read_text(self, filename):
+        return self.read_bytes(filename).decode()
+
+    def open(self, filename):
+        with zipfile.ZipFile(str(self.segment)) as zf:
+            try:
+                # the member keeps the archive open until it is closed
+                return zf.open(self.member(filename))
+            except KeyError as e:
+                raise FileNotFoundError(self.member(filename)) from e
+
+    def read_log(self, last_n=None):
+        return parser.read_log(self.namelist(), self.open, last_n=last_n)
+
+
+def packed_run(link, storage=POSIX):
+    """
+    Return PackedRun if index entry or mark points to a segment, None otherwise.
+    Only the link itself is read, so it is as cheap as listing a directory.
+    """
+    link = pathlib.Path(link)
+    if not storage.is_symlink(link):
+        return None
+    target = storage.readlink(link)
+    if not parser.SEGMENT_PATTERN.match(os.path.basename(target)):
+        return None
+    name = link.name
+    if name.endswith("." + parser.EXT):
+        name = name[: -len(parser.EXT) - 1]
+    return PackedRun(link.parent / target, name)
+
+
+def run_status(run, storage=POSIX):
+    """Status of a run directory or a PackedRun"""
+    if isinstance(run, PackedRun):
+        try:
+            return parser.read_status(run.read_text(parser.STATUS_FILE))
+        except FileNotFoundError:
+            return None
+    return parser.run_status(run, storage=storage)
+
+
+def read_segment_params(segment, names, errors="raise"):
+    """
+    Records of packed runs, None for skipped ones, see `parser.check_record`.
+    `root` of the record is where the run was before packing, `SEGMENT_KEY`
+    has the segment it is read from.
+    """
+    segment = pathlib.Path(segment)
+    records = []
+    with zipfile.ZipFile(str(segment)) as zf:
+        members = set(zf.namelist())
+        for name in names:
+            params = zf.read("{}/{}".format(name, parser.PARAMS_FILE)).decode()
+            extra = {}
+            for filename in parser.RUN_EXTRA_FILES:
+                member = "{}/{}".format(name, filename)
+                if member in members:
+                    extra[filename] = zf.read(member).decode()
+            record = parser.check_record(
+                params, extra, pathlib.Path("runs", name), errors=errors
+            )
+            if record is not None:
+                record[SEGMENT_KEY] = str(
+                    pathlib.Path(segment.parent.name, segment.name)
+                )
+            records.append(record)
+    return records
+
+
+def _collect_links(directory):
+    links = collections.defaultdict(list)
+    for entry in os.scandir(str(directory.index)):
+        links[entry.name[: -len(parser.EXT) - 1]].append(pathlib.Path(entry.path))
+    for dirpath, dirnames, filenames in os.walk(str(directory.marked)):
+        # symlinks to runs are not followed by os.walk, they are listed as dirnames
+        for name in dirnames + filenames:
+            if parser.DIR_PATTERN.match(name):
+                path = pathlib.Path(dirpath, name)
+                if path.is_symlink():
+                    links[name].append(path)
+    return links
+
+
+def _segment_path(directory, first, last):
+    name = parser.SEGMENT_FORMAT.format(
+        first=str(first).zfill(directory.zfill), last=str(last).zfill(directory.zfill)
+    )
+    segment = directory.packs / name
+    i = 0
+    while segment.exists():
+        i += 1
+        segment = segment.with_name("{}.{}.zip".format(name[: -len(".zip")], i))
+    return segment
+
+
+def _write_segment(segment, runs):
+    fd, tmpname = tempfile.mkstemp(dir=str(segment.parent), prefix=".tmp-")
+    os.close(fd)
+    try:
+        with zipfile.ZipFile(tmpname, "w", zipfile.ZIP_STORED) as zf:
+            for run in runs:
+                for path in sorted(run.rglob("*")):
+                    if path.is_file():
+                        zf.write(
+                            str(path), "{}/{}".format(run.name, path.relative_to(run))
+                        )
+        os.replace(tmpname, str(segment))
+    except BaseException:
+        os.unlink(tmpname)
+        raise
+
+
+def pack_runs(directory, older_than, segment_size=1000, force=False):
+    """
+    Move runs started more than `older_than` (timedelta) ago from runs/ into
+    archive segments in packs/. Index entries and marks are repointed to the
+    segment, the run directories are removed. Returns created segments.
+    Running runs are skipped, stale ones too unless `force` is set.
+    """
+    if segment_size < 1:
+        raise ValueError("segment_size should be positive")
+    if not isinstance(directory.storage, PosixStorage):
+        raise NotImplementedError("packing needs runs on a posix filesystem")
+    segments = []
+    with directory.lock, directory.permissions_context():
+        deadline = datetime.datetime.now() - older_than
+        runs = []
+        for entry in os.scandir(str(directory.runs)):
+            parsed = parser.parse_dir_name(entry.name)
+            if parsed is None or not entry.is_dir() or parsed.time >= deadline:
+                continue
+            status = parser.run_status(entry.path)
+            if status == "running" or (status == "stale" and not force):
+                # may be still alive, pack it next time
+                continue
+            runs.append((parsed.num, pathlib.Path(entry.path)))
+        if not runs:
+            return segments
+        runs = [run for _, run in sorted(runs)]
+        links = _collect_links(directory)
+        directory.packs.mkdir(exist_ok=True)
+        for i in range(0, len(runs), segment_size):
+            chunk = runs[i : i + segment_size]
+            segment = _segment_path(
+                directory,
+                parser.parse_dir_name(chunk[0].name).num,
+                parser.parse_dir_name(chunk[-1].name).num,
+            )
+            _write_segment(segment, chunk)
+            for run in chunk:
+                for link in links.get(run.name, ()):
+                    link.unlink()
+                    link.symlink_to(os.path.relpath(str(segment), str(link.parent)))
+                shutil.rmtree(str(run))
+            segments.append(segment)
+    return segments
@@ -14,8 +14,16 @@ import collections
 import shutil
 import traceback
 import git as gitlib
-from filelock import FileLock
 import contextlib
+import io
+import hashlib
+import json
+import tempfile
+import threading
+import gzip
+import time as timelib
+import warnings
+from .storage import POSIX, PosixStorage
 
 try:
     # happens in an interactive session
@@ -23,6 +31,18 @@ try:
 except ImportError:
     termios_error = inputimeout.TimeoutOccurred
 
+try:
+    import resource
+except ImportError:
+    # not available on Windows
+    resource = None
+
+try:
+    # optional, allows to sample memory of child processes
+    import psutil
+except ImportError:
+    psutil = None
+
 
 __all__ = ["ExParser", "simpleroot", "optional", "ArgumentError"]
 
@@ -31,10 +51,41 @@ TIME_FORMAT_DIR = "%Y-%m-%d-%H-%M-%S"
 TIME_FORMAT = "%Y-%m-%dT%H:%M:%S"
 DIR_FORMAT = "{num}-{time}"
 DIR_PATTERN = re.compile(r"^\d+-\d{4}-\d{2}-\d{2}-\d{2}-\d{2}-\d{2}")
+DIR_NAME_PATTERN = re.compile(
+    r"^(?P<num>\d+)-(?P<time>\d{4}-\d{2}-\d{2}-\d{2}-\d{2}-\d{2})(?:-(?P<tag>.*))?$"
+)
+SEGMENT_FORMAT = "{first}-{last}.zip"
+SEGMENT_PATTERN = re.compile(r"^(?P<first>\d+)-(?P<last>\d+)(?:\.\d+)?\.zip$")
 EXT = "yaml"
 PARAMS_FILE = "params." + EXT
 DIFF_FILE = "changes.diff"
+STATUS_FILE = "status." + EXT
+RESOURCES_FILE = "resources." + EXT
+# symlinks removed when the run failed, to restore them on resume
+LINKS_FILE = "links." + EXT
+# records and value counts of the index kept between Index objects
+SUMMARY_FILE = "summary.json"
+RESOURCES_SERIES_FILE = "resources.csv"
+RESOURCES_PREFIX = "res_"
+# small files read together with params to build a record
+RUN_EXTRA_FILES = (STATUS_FILE, RESOURCES_FILE)
+LOG_FILE = "log.txt"
+# rotated segments are log.txt.000001, log.txt.000002, ... oldest first
+LOG_SEGMENT_PATTERN = re.compile(r"^" + re.escape(LOG_FILE) + r"\.(\d+)(\.gz)?$")
+LOG_BLOCK = 1 << 16
+HEARTBEAT_INTERVAL = 60
+# heartbeat older than this number of intervals means the process is dead
+HEARTBEAT_STALE = 3
 FOLDER_DEFAULT = "exman"
+BLOB_HASH = "sha256"
+HASH_KEY = "params_hash"
+# run specific keys that do not define the configuration
+HASH_IGNORE = {"root", "tmp", "git_dirty", "name", "config_file", "safe_experiment"}
+DUPLICATE_POLICIES = {None, "skip", "warn", "reuse"}
+# keys every complete params file has, written last
+RECORD_KEYS = ("id", "time", "root")
+RECORD_ERRORS = {"raise", "skip", "repair"}
+BLOB_CHUNK = 1 << 20
 
 Validator = collections.namedtuple("Validator", "call,message")
 # make this public
@@ -99,6 +150,20 @@ def optional(t):
     return converter
 
 
+DirName = collections.namedtuple("DirName", "num, time, tag")
+
+
+def parse_dir_name(name):
+    match = DIR_NAME_PATTERN.match(name)
+    if match is None:
+        return None
+    return DirName(
+        int(match.group("num")),
+        datetime.datetime.strptime(match.group("time"), TIME_FORMAT_DIR),
+        match.group("tag") or "",
+    )
+
+
 _ExperimentDirectory = collections.namedtuple(
     "ExperimentDirectory", "absroot, relroot, name, time, num, shared"
 )
@@ -112,7 +177,8 @@ class ExperimentDirectory(_ExperimentDirectory):
 class ExmanDirectory(object):
     RESERVED_DIRECTORIES = {"runs", "index", "tmp", "marked", "fails"}
 
-    def __init__(self, root, zfill=6, mode="create", shared=False):
+    def __init__(self, root, zfill=6, mode="create", shared=False, storage=None):
+        self.storage = POSIX if storage is None else storage
         with umask_permissions(shared):
             assert mode in {"create", "validate"}
             self.root = root
@@ -122,22 +188,22 @@ class ExmanDirectory(object):
             if mode == "create":
                 if not root.is_absolute():
                     raise ValueError(root, "Root directory is not an absolute path")
-                os.makedirs(self.root, exist_ok=True)
-            if not root.exists():
+                self.storage.makedirs(root)
+            if not self.storage.exists(root):
                 raise ValueError(root, "Root directory does not exist")
             self.root = pathlib.Path(root)
             self.zfill = zfill
             if mode == "create":
                 for directory in self.RESERVED_DIRECTORIES:
-                    getattr(self, directory).mkdir(exist_ok=True)
+                    self.storage.makedirs(getattr(self, directory))
             else:
                 for directory in self.RESERVED_DIRECTORIES:
-                    if not getattr(self, directory).exists():
+                    if not self.storage.exists(getattr(self, directory)):
                         raise ValueError(
                             "The provided directory does not seem to be Exman root directory"
                         )
 
-            self.lock = FileLock(str(self.root / "lock"))
+            self.lock = self.storage.lock(self.root / "lock")
             self.shared = shared
 
     def permissions_context(self):
@@ -163,27 +229,165 @@ class ExmanDirectory(object):
     def tmp(self):
         return self.root / "tmp"
 
+    @property
+    def packs(self):
+        # created lazily by `exman pack`
+        return self.root / "packs"
+
+    @property
+    def objects(self):
+        # created lazily, old roots are still valid without it
+        return self.root / "objects"
+
+    @property
+    def hashes(self):
+        # created lazily, maps parameter hash to the index entry of the latest
+        # finished run
+        return self.root / "hashes"
+
+    def register_hash(self, params_hash, name):
+        with self.permissions_context():
+            self.storage.makedirs(self.hashes)
+            self.storage.symlink(
+                self.hashes / params_hash,
+                pathlib.Path("..", "index", yaml_file(name)),
+                replace=True,
+            )
+
+    def blob_path(self, digest):
+        return self.objects / digest[:2] / digest[2:]
+
+    def has_blob(self, digest):
+        return self.blob_path(digest).exists()
+
+    def _write_blob(self, digest, chunks):
+        blob = self.blob_path(digest)
+        with self.permissions_context():
+            blob.parent.mkdir(parents=True, exist_ok=True)
+            fd, tmpname = tempfile.mkstemp(dir=str(blob.parent), prefix=".tmp-")
+            try:
+                with os.fdopen(fd, "wb") as f:
+                    for chunk in chunks:
+                        f.write(chunk)
+                # blobs are shared between runs and should never be modified in place
+                os.chmod(tmpname, 0o444)
+                os.replace(tmpname, str(blob))
+            except BaseException:
+                os.unlink(tmpname)
+                raise
+        return blob
+
+    def store_bytes(self, data):
+        digest = hashlib.new(BLOB_HASH, data).hexdigest()
+        if not self.has_blob(digest):
+            self._write_blob(digest, [data])
+        return digest
+
+    def store_file(self, path):
+        h = hashlib.new(BLOB_HASH)
+        with open(path, "rb") as f:
+            for chunk in iter(functools.partial(f.read, BLOB_CHUNK), b""):
+                h.update(chunk)
+        digest = h.hexdigest()
+        if not self.has_blob(digest):
+            with open(path, "rb") as f:
+                self._write_blob(
+                    digest, iter(functools.partial(f.read, BLOB_CHUNK), b"")
+                )
+        return digest
+
+    def link_blob(self, digest, target):
+        target = pathlib.Path(target)
+        blob = self.blob_path(digest)
+        with self.permissions_context():
+            try:
+                os.link(str(blob), str(target))
+            except OSError:
+                # hardlinks are not available across devices and on some filesystems
+                # runs are moved between runs/tmp/fails, relative symlink survives that
+                target.symlink_to(os.path.relpath(str(blob), str(target.parent)))
+        return target
+
     def max_ex(self):
         max_num = 0
-        for directory in filter(
-            lambda d: DIR_PATTERN.match(d.name),
+        for name in filter(
+            DIR_PATTERN.match,
             itertools.chain(
-                self.runs.iterdir(), self.tmp.iterdir(), self.fails.iterdir()
+                self.storage.listdir(self.runs),
+                self.storage.listdir(self.tmp),
+                self.storage.listdir(self.fails),
             ),
         ):
-            num = int(directory.name.split("-", 1)[0])
+            num = int(name.split("-", 1)[0])
             if num > max_num:
                 max_num = num
+        if self.storage.exists(self.packs):
+            # packed runs are not in runs/ anymore but their ids are still taken
+            for name in self.storage.listdir(self.packs):
+                match = SEGMENT_PATTERN.match(name)
+                if match and int(match.group("last")) > max_num:
+                    max_num = int(match.group("last"))
         return max_num
 
     def num_ex(self):
-        return len(
-            list(filter(lambda d: DIR_PATTERN.match(d.name), self.runs.iterdir()))
-        )
+        return len(list(filter(DIR_PATTERN.match, self.storage.listdir(self.runs))))
 
     def next_ex(self):
         return self.max_ex() + 1
 
+    def find_run(self, run_id):
+        """Directory of the run in runs, tmp or fails"""
+        for directory in (self.runs, self.tmp, self.fails):
+            for name in self.storage.listdir(directory):
+                parsed = parse_dir_name(name)
+                if parsed is not None and parsed.num == run_id:
+                    return directory / name
+        raise KeyError(run_id)
+
+    def restore(self, run_id, extra_links=()):
+        """
+        Move failed run back from fails and restore its index and mark symlinks.
+        `extra_links` are (link, target) pairs to restore as well.
+        Returns the run directory and restored symlinks.
+        """
+        with self.lock, self.permissions_context():
+            run = self.find_run(run_id)
+            params = yaml.safe_load(self.storage.read_text(run / PARAMS_FILE))
+            if run.parent == self.fails:
+                target = (self.tmp if params.get("tmp") else self.runs) / run.name
+                self.storage.move(run, target)
+                run = target
+            links = list(extra_links)
+            if not params.get("tmp"):
+                links.append(
+                    (
+                        self.index / yaml_file(run.name),
+                        pathlib.Path("..", "runs", run.name, PARAMS_FILE),
+                    )
+                )
+            if self.storage.exists(run / LINKS_FILE):
+                links.extend(
+                    (self.root / link, target)
+                    for link, target in yaml.safe_load(
+                        self.storage.read_text(run / LINKS_FILE)
+                    )
+                )
+                self.storage.unlink(run / LINKS_FILE)
+            restored = []
+            for link, target in links:
+                link = pathlib.Path(link)
+                if link in restored:
+                    continue
+                if not self.storage.is_symlink(link):
+                    self.storage.makedirs(link.parent)
+                    self.storage.symlink(link, target)
+                    print("Created symlink from", link, "->", target)
+                restored.append(link)
+            if self.storage.exists(self.root / SUMMARY_FILE):
+                # the saved summary may already have a final status of the run
+                self.storage.unlink(self.root / SUMMARY_FILE)
+            return run, restored
+
     def next_ex_str(self):
         return str(self.next_ex()).zfill(self.zfill)
 
@@ -204,7 +408,7 @@ class ExmanDirectory(object):
                     relroot = pathlib.Path("runs") / name
                 # this process now safely owns root directory
                 # raises FileExistsError on fail
-                absroot.mkdir()
+                self.storage.mkdir(absroot)
         except FileExistsError:  # shit still happens
             return self.new_directory(tmp, tag)
         return ExperimentDirectory(absroot, relroot, name, time, num, self.shared)
@@ -229,8 +433,10 @@ class VolatileAwareParser(object):
 
 
 class ParserWithRoot(ExmanDirectory, configargparse.ArgumentParser):
-    def __init__(self, *args, root=None, zfill=6, shared=False, **kwargs):
-        ExmanDirectory.__init__(self, root, zfill, mode="create", shared=shared)
+    def __init__(self, *args, root=None, zfill=6, shared=False, storage=None, **kwargs):
+        ExmanDirectory.__init__(
+            self, root, zfill, mode="create", shared=shared, storage=storage
+        )
         configargparse.ArgumentParser.__init__(self, *args, **kwargs)
         self.register("type", bool, str2bool)
 
@@ -267,9 +473,17 @@ class ExParser(ParserWithRoot):
         automark=(),
         git=None,
         git_assert_clean=False,
+        duplicates=None,
         **kwargs
     ):
+        if duplicates not in DUPLICATE_POLICIES:
+            raise ValueError(
+                "duplicates should be one of {}, got {}".format(
+                    DUPLICATE_POLICIES, duplicates
+                )
+            )
         self._volatile = set()
+        self._volatile_dests = set()
         super().__init__(
             *args,
             root=root,
@@ -281,6 +495,7 @@ class ExParser(ParserWithRoot):
             **kwargs
         )
         self.automark = automark
+        self.duplicates = duplicates
         self.validators = []
         self.setters = []
         self._init_git(git, git_assert_clean)
@@ -327,44 +542,157 @@ class ExParser(ParserWithRoot):
             self.set_additional_params(args)
             self.validate_params(args)
 
+            diff = self._git_diff()
+            params_hash = self.params_hash(args, diff)
+            if self.duplicates is not None and not args.tmp:
+                duplicate = self.find_duplicate(params_hash)
+                if duplicate is not None:
+                    reused = self._handle_duplicate(args, duplicate, params_hash)
+                    if reused is not None:
+                        return reused
+
             absroot, relroot, name, time, num, _ = self.new_directory(
                 args.tmp, args.name
             )
             args.root = absroot
             yaml_params_path = args.root / PARAMS_FILE
             rel_yaml_params_path = pathlib.Path("..", "runs", name, PARAMS_FILE)
-            self.dump_config(args, relroot, time, num, yaml_params_path)
-            if self.repo is not None and self.repo.is_dirty():
-                self.dump_git_diff(args.root / DIFF_FILE)
-            print(yaml_params_path.read_text())
+            # params are complete before the index entry points to them
+            params = self.dump_config(
+                args, relroot, time, num, yaml_params_path, params_hash=params_hash
+            )
+            if diff:
+                self.dump_git_diff(args.root / DIFF_FILE, diff)
+            print(params)
             created_symlinks = []
             if not args.tmp:
                 symlink = self.index / yaml_file(name)
                 created_symlinks.append(symlink)
-                symlink.symlink_to(rel_yaml_params_path)
+                self.storage.symlink(symlink, rel_yaml_params_path)
                 print("Created symlink from", symlink, "->", rel_yaml_params_path)
             if self.automark and not args.tmp:
-                automark_path_part = pathlib.Path(
-                    *itertools.chain.from_iterable(
-                        (mark, str(getattr(args, mark, ""))) for mark in self.automark
-                    )
-                )
-                markpath = pathlib.Path(self.marked, automark_path_part)
-                markpath.mkdir(exist_ok=True, parents=True)
-                relpathmark = (
-                    pathlib.Path("..", *([".."] * len(automark_path_part.parts)))
-                    / "runs"
-                    / name
-                )
-                (markpath / name).symlink_to(relpathmark, target_is_directory=True)
-                created_symlinks.append(markpath / name)
-                print("Created symlink from", markpath / name, "->", relpathmark)
+                marklink, relpathmark = self._automark_link(args, name)
+                self.storage.makedirs(marklink.parent)
+                self.storage.symlink(marklink, relpathmark)
+                created_symlinks.append(marklink)
+                print("Created symlink from", marklink, "->", relpathmark)
+            # the hash is registered once the run finishes
             safe_experiment = SafeExperiment(
-                self.root, args.root, extra_symlinks=created_symlinks
+                self.root,
+                args.root,
+                extra_symlinks=created_symlinks,
+                storage=self.storage,
+                params_hash=None if args.tmp else params_hash,
             )
             args.safe_experiment = safe_experiment
             return args
 
+    def _automark_link(self, args, name):
+        automark_path_part = pathlib.Path(
+            *itertools.chain.from_iterable(
+                (mark, str(getattr(args, mark, ""))) for mark in self.automark
+            )
+        )
+        markpath = pathlib.Path(self.marked, automark_path_part)
+        relpathmark = (
+            pathlib.Path("..", *([".."] * len(automark_path_part.parts)))
+            / "runs"
+            / name
+        )
+        return markpath / name, relpathmark
+
+    def _git_diff(self):
+        """Uncommitted changes of the repository, empty if clean or no repository"""
+        if self.repo is None or not self.repo.is_dirty():
+            return b""
+        return self.repo.git.diff(self.repo.head).encode()
+
+    def params_hash(self, args, diff=None):
+        """
+        Hash of the configuration: parameters and, with a repository,
+        the commit and the uncommitted changes (`diff` if already known)
+        """
+        params = {
+            key: value
+            for key, value in args.__dict__.items()
+            if key not in HASH_IGNORE and key not in self._volatile_dests
+        }
+        if self.repo is not None:
+            if diff is None:
+                diff = self._git_diff()
+            # keys can not clash with argument names
+            params["git:commit"] = str(self.repo.head.commit)
+            if diff:
+                params["git:diff"] = hashlib.new(BLOB_HASH, diff).hexdigest()
+        canonical = json.dumps(params, sort_keys=True, default=str)
+        return hashlib.new(BLOB_HASH, canonical.encode()).hexdigest()
+
+    def find_duplicate(self, params_hash):
+        """
+        Name of the latest finished run with the same parameters or None.
+        Deleted runs are not in the index and are not found.
+        """
+        link = self.hashes / params_hash
+        if not self.storage.exists(link):
+            return None
+        run = self.storage.resolve(link).parent
+        if run_status(run, storage=self.storage) != "finished":
+            # e.g. resumed and failed again, moved to fails or crashed
+            return None
+        return run.name
+
+    def _handle_duplicate(self, args, name, params_hash):
+        message = "same configuration was already run in {}".format(name)
+        if self.duplicates == "skip":
+            self.exit(0, "skipping: {}\n".format(message))
+        if self.duplicates == "reuse" and self.storage.is_dir(self.runs / name):
+            print("reusing: {}".format(message))
+            args.root = self.runs / name
+            extra_symlinks = [self.index / yaml_file(name)]
+            if self.automark:
+                extra_symlinks.append(self._automark_link(args, name)[0])
+            # the original run is finished, failing again should not move it
+            args.safe_experiment = SafeExperiment(
+                self.root,
+                args.root,
+                extra_symlinks=extra_symlinks,
+                storage=self.storage,
+                move_to_fails=False,
+                params_hash=params_hash,
+            )
+            return args
+        sys.stderr.write("warning: {}\n".format(message))
+        return None
+
+    def resume(self, run_id, args=()):
+        """
+        Continue the run in its own directory, e.g. after the node was preempted.
+        The namespace is restored from its params file skipping volatile keys,
+        `args` override stored values. Failed run is moved back from fails.
+        """
+        with umask_permissions(self.shared):
+            run = self.find_run(run_id)
+            params = self.storage.read_text(run / PARAMS_FILE)
+            namespace = configargparse.ArgumentParser.parse_args(
+                self, list(args), config_file_contents=params
+            )
+            extra_links = []
+            if self.automark and not namespace.tmp:
+                extra_links.append(self._automark_link(namespace, run.name))
+            namespace.root, links = self.restore(run_id, extra_links)
+            namespace.safe_experiment = SafeExperiment(
+                self.root,
+                namespace.root,
+                extra_symlinks=links,
+                storage=self.storage,
+                params_hash=(
+                    None
+                    if namespace.tmp
+                    else (yaml.safe_load(params) or {}).get(HASH_KEY)
+                ),
+            )
+            return namespace
+
     def register_validator(
         self, validator: callable, message: str = "validation error"
     ):
@@ -390,6 +718,7 @@ class ExParser(ParserWithRoot):
             config_file_keys = self.get_possible_config_keys(action)
             # the key used to save value
             self._volatile.add(config_file_keys[0])
+            self._volatile_dests.add(action.dest)
         return action
 
     @property
@@ -405,20 +734,32 @@ class ExParser(ParserWithRoot):
     def _config_file_parser(self):
         self.__config_file_parser = None
 
-    def dump_git_diff(self, diff_file):
-        with open(diff_file, "w") as f:
-            f.write(self.repo.git.diff(self.repo.head))
-
-    def dump_config(self, args, relroot, time, num, target_yaml):
-        with target_yaml.open("a") as f:
-            dumpd = args.__dict__.copy()
-            if self.repo is not None:
-                dumpd["commit"] = str(self.repo.head.commit)
-                dumpd["dirty"] = self.repo.is_dirty()
-            dumpd["root"] = relroot
-            yaml.dump(dumpd, f, default_flow_style=False)
-            print("time: '{}'".format(time.strftime(TIME_FORMAT)), file=f)
-            print("id:", int(num), file=f)
+    def dump_git_diff(self, diff_file, diff=None):
+        # the same diff is often shared by many runs, store it once
+        if diff is None:
+            diff = self._git_diff()
+        if not isinstance(self.storage, PosixStorage):
+            # the blob store needs real files, keep a plain copy in the run
+            self.storage.write_text(diff_file, diff.decode(errors="replace"))
+            return
+        digest = self.store_bytes(diff)
+        self.link_blob(digest, diff_file)
+
+    def dump_config(self, args, relroot, time, num, target_yaml, params_hash=None):
+        """Write params file with a single atomic write, returns its content"""
+        f = io.StringIO()
+        dumpd = args.__dict__.copy()
+        if self.repo is not None:
+            dumpd["commit"] = str(self.repo.head.commit)
+            dumpd["dirty"] = self.repo.is_dirty()
+        dumpd["root"] = relroot
+        if params_hash is not None:
+            dumpd[HASH_KEY] = params_hash
+        yaml.dump(dumpd, f, default_flow_style=False)
+        print("time: '{}'".format(time.strftime(TIME_FORMAT)), file=f)
+        print("id:", int(num), file=f)
+        self.storage.write_text(target_yaml, f.getvalue())
+        return f.getvalue()
 
     def get_possible_config_keys(self, action):
         keys = super().get_possible_config_keys(action)
@@ -444,35 +785,412 @@ def _validate(validator: Validator, params: argparse.Namespace):
             )
 
 
+def write_status(run, state, started, interval=HEARTBEAT_INTERVAL, storage=POSIX):
+    status = dict(
+        state=state,
+        pid=os.getpid(),
+        started=started.strftime(TIME_FORMAT),
+        heartbeat=datetime.datetime.now().timestamp(),
+        interval=interval,
+    )
+    storage.write_text(pathlib.Path(run) / STATUS_FILE, yaml.dump(status))
+
+
+def read_status(text, now=None):
+    """
+    State of the run from status file content: running, finished, failed,
+    interrupted or stale if the heartbeat stopped without final state.
+    Without heartbeat (no interval) a running run is never stale.
+    """
+    status = yaml.safe_load(text)
+    if not isinstance(status, dict) or "state" not in status:
+        return None
+    if status["state"] == "running" and status.get("interval"):
+        if now is None:
+            now = datetime.datetime.now()
+        if now.timestamp() - status["heartbeat"] > status["interval"] * HEARTBEAT_STALE:
+            return "stale"
+    return status["state"]
+
+
+def run_status(run, now=None, storage=POSIX):
+    try:
+        return read_status(storage.read_text(pathlib.Path(run) / STATUS_FILE), now)
+    except FileNotFoundError:
+        return None
+
+
+def _parse_params(params):
+    return configargparse.YAMLConfigFileParser().parse(io.StringIO(params))
+
+
+def _parse_prefix(params):
+    """Params from the longest prefix of complete lines that parses"""
+    lines = params.splitlines(keepends=True)
+    if lines and not lines[-1].endswith("\n"):
+        lines.pop()
+    while lines:
+        try:
+            return _parse_params("".join(lines))
+        except configargparse.ConfigFileParserException:
+            lines.pop()
+    return collections.OrderedDict()
+
+
+def parse_record(params, extra):
+    """
+    Record of the run from params file content and contents of `RUN_EXTRA_FILES`
+    found in the run directory. Values are kept raw as strings.
+    """
+    return _with_extra(_parse_params(params), extra)
+
+
+def check_record(params, extra, relroot, errors="raise"):
+    """
+    Same as `parse_record` but checks the params file is complete and belongs to
+    the run directory `relroot` (relative to the exman root). Half-written files,
+    left by crashes of older versions, raise ValueError with `errors="raise"`,
+    give None with `"skip"` and with `"repair"` id, time and root are derived
+    from the directory name while the rest is kept from the parsable part.
+    """
+    if errors not in RECORD_ERRORS:
+        raise ValueError(
+            "errors should be one of {}, got {}".format(RECORD_ERRORS, errors)
+        )
+    relroot = pathlib.Path(relroot)
+    parsed = parse_dir_name(relroot.name)
+    try:
+        record = _parse_params(params)
+    except configargparse.ConfigFileParserException as e:
+        record, problem = None, str(e).splitlines()[0]
+    else:
+        missing = [key for key in RECORD_KEYS if record.get(key) in (None, "")]
+        if missing:
+            problem = "missing " + ", ".join(missing)
+        elif parsed is not None and record["id"] != str(int(parsed.num)):
+            problem = "id {} does not match the directory".format(record["id"])
+        else:
+            return _with_extra(record, extra)
+    message = "{}: broken {}, {}".format(relroot, PARAMS_FILE, problem)
+    if errors == "raise":
+        raise ValueError(message)
+    if errors == "skip" or parsed is None:
+        warnings.warn(message + ", skipped")
+        return None
+    warnings.warn(message + ", repaired")
+    if record is None:
+        record = _parse_prefix(params)
+    record["id"] = str(int(parsed.num))
+    record["time"] = parsed.time.strftime(TIME_FORMAT)
+    if record.get("root") in (None, ""):
+        record["root"] = str(relroot)
+    return _with_extra(record, extra)
+
+
+def _with_extra(record, extra):
+    status = extra.get(STATUS_FILE)
+    record.setdefault("status", None if status is None else read_status(status))
+    if RESOURCES_FILE in extra:
+        for key, value in (yaml.safe_load(extra[RESOURCES_FILE]) or {}).items():
+            record.setdefault(RESOURCES_PREFIX + key, str(value))
+    return record
+
+
+def _proc_io():
+    # linux only, bytes really read from and written to storage
+    try:
+        with open("/proc/self/io") as f:
+            fields = dict(line.split(":") for line in f if ":" in line)
+        return int(fields["read_bytes"]), int(fields["write_bytes"])
+    except (OSError, KeyError, ValueError):
+        return 0, 0
+
+
+def _proc_rss():
+    if psutil is not None:
+        process = psutil.Process()
+        rss = process.memory_info().rss
+        for child in process.children(recursive=True):
+            try:
+                rss += child.memory_info().rss
+            except psutil.Error:
+                pass
+        return rss
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, AttributeError):
+        return 0
+
+
+class ResourceUsage(object):
+    """Wall time, cpu time, memory and io of the process and its children"""
+
+    # ru_maxrss is in kilobytes on linux and in bytes on macOS
+    MAXRSS_UNIT = 1 if sys.platform == "darwin" else 1024
+
+    def __init__(self):
+        self.wall = timelib.time()
+        self.cpu_user = self.cpu_system = 0.0
+        # peaks cover the whole life of the process, earlier runs included,
+        # so memory of the process is sampled and the peak of waited children
+        # counts only if it has grown during the run
+        self.children_max_rss = 0
+        self.read_bytes, self.write_bytes = _proc_io()
+        if resource is not None:
+            for who in (resource.RUSAGE_SELF, resource.RUSAGE_CHILDREN):
+                usage = resource.getrusage(who)
+                self.cpu_user += usage.ru_utime
+                self.cpu_system += usage.ru_stime
+                if who == resource.RUSAGE_CHILDREN:
+                    self.children_max_rss = usage.ru_maxrss * self.MAXRSS_UNIT
+                    # children are not in /proc/self/io, blocks are 512 bytes
+                    self.read_bytes += usage.ru_inblock * 512
+                    self.write_bytes += usage.ru_oublock * 512
+
+
+class _ResourceMonitor(object):
+    FIELDS = ("elapsed", "cpu_user", "cpu_system", "rss", "read_bytes", "write_bytes")
+
+    def __init__(self, run, interval, storage=POSIX):
+        self.run = pathlib.Path(run)
+        self.interval = interval
+        self.storage = storage
+        self.peak_rss = 0
+
+    def start(self):
+        self.first = ResourceUsage()
+        self.storage.append_text(
+            self.run / RESOURCES_SERIES_FILE, ",".join(self.FIELDS) + "\n"
+        )
+        self.sample()
+        self.thread = _Periodic(self.interval, self.sample)
+        self.thread.start()
+
+    def sample(self):
+        usage = ResourceUsage()
+        rss = _proc_rss()
+        self.peak_rss = max(self.peak_rss, rss)
+        row = (
+            round(usage.wall - self.first.wall, 3),
+            round(usage.cpu_user - self.first.cpu_user, 3),
+            round(usage.cpu_system - self.first.cpu_system, 3),
+            rss,
+            usage.read_bytes - self.first.read_bytes,
+            usage.write_bytes - self.first.write_bytes,
+        )
+        self.storage.append_text(
+            self.run / RESOURCES_SERIES_FILE, ",".join(map(str, row)) + "\n"
+        )
+
+    def stop(self):
+        self.thread.stop()
+
+    def summarize(self, run):
+        # the run directory may be moved to fails meanwhile
+        self.run = pathlib.Path(run)
+        self.sample()
+        last = ResourceUsage()
+        summary = dict(
+            wall_time=round(last.wall - self.first.wall, 3),
+            cpu_user=round(last.cpu_user - self.first.cpu_user, 3),
+            cpu_system=round(last.cpu_system - self.first.cpu_system, 3),
+            max_rss=max(
+                (
+                    last.children_max_rss
+                    if last.children_max_rss > self.first.children_max_rss
+                    else 0
+                ),
+                self.peak_rss,
+            ),
+            read_bytes=last.read_bytes - self.first.read_bytes,
+            write_bytes=last.write_bytes - self.first.write_bytes,
+        )
+        self.storage.write_text(self.run / RESOURCES_FILE, yaml.dump(summary))
+        return summary
+
+
+class _Periodic(threading.Thread):
+    def __init__(self, interval, call):
+        super().__init__(daemon=True)
+        self.interval = interval
+        self.call = call
+        self._stopped = threading.Event()
+
+    def run(self):
+        while not self._stopped.wait(self.interval):
+            self.call()
+
+    def stop(self):
+        self._stopped.set()
+        self.join()
+
+
+def _compress(path):
+    path = pathlib.Path(path)
+    tmpname = path.with_name("." + path.name + ".gz")
+    with path.open("rb") as src, gzip.open(str(tmpname), "wb") as dst:
+        shutil.copyfileobj(src, dst)
+    os.replace(str(tmpname), str(path) + ".gz")
+    path.unlink()
+
+
+def _log_segments(names):
+    """Log files among names, oldest first, plain segments win over compressed"""
+    segments = {}
+    for name in names:
+        match = LOG_SEGMENT_PATTERN.match(name)
+        if match:
+            num = int(match.group(1))
+            if not match.group(2) or num not in segments:
+                segments[num] = name
+    files = [segments[num] for num in sorted(segments)]
+    if LOG_FILE in names:
+        files.append(LOG_FILE)
+    return files
+
+
+def _tail(f, n):
+    """Tail of the file with more than n newlines or the whole file"""
+    f.seek(0, os.SEEK_END)
+    pos = f.tell()
+    data = b""
+    while pos > 0 and data.count(b"\n") <= n:
+        step = min(LOG_BLOCK, pos)
+        pos -= step
+        f.seek(pos)
+        data = f.read(step) + data
+    return data
+
+
+def _open_log(name, opener):
+    if name.endswith(".gz"):
+        return gzip.GzipFile(fileobj=opener(name), mode="rb")
+    return opener(name)
+
+
+def read_log(names, opener, last_n=None):
+    """
+    Read log split in rotated segments, `opener(name)` returns binary file object.
+    With `last_n` only the needed segments are read, plain ones from the end.
+    """
+    files = _log_segments(names)
+    if last_n is None:
+        chunks = []
+        for name in files:
+            with _open_log(name, opener) as f:
+                chunks.append(f.read())
+        return b"".join(chunks).decode(errors="replace")
+    data = b""
+    for name in reversed(files):
+        with _open_log(name, opener) as f:
+            if name.endswith(".gz"):
+                # gzip can not seek from the end, segments are bounded anyway
+                data = f.read() + data
+            else:
+                data = _tail(f, last_n - data.count(b"\n")) + data
+        if data.count(b"\n") > last_n:
+            break
+    lines = data.decode(errors="replace").splitlines(keepends=True)
+    return "".join(lines[-last_n:] if last_n else [])
+
+
+def read_run_log(run, last_n=None, storage=POSIX):
+    run = pathlib.Path(run)
+    return read_log(
+        storage.listdir(run),
+        lambda name: storage.open_binary(run / name),
+        last_n=last_n,
+    )
+
+
 class _TeeOutput(object):
-    def __init__(self, stream, out):
+    def __init__(self, stream, out, max_bytes=None, storage=POSIX):
         self.out = pathlib.Path(out)
         self.stream = stream
+        self.max_bytes = max_bytes
+        self.storage = storage
+        self.compressors = []
 
     def write(self, buffer):
-        with self.out.open("a") as f:
-            f.write(buffer)
-            f.flush()
+        size = self.storage.append_text(self.out, buffer)
         self.stream.write(buffer)
         self.flush()
+        if self.max_bytes and size >= self.max_bytes:
+            self.rotate()
+
+    def rotate(self):
+        segments = _log_segments(self.storage.listdir(self.out.parent))
+        num = 1
+        if segments and segments[-1] == LOG_FILE:
+            segments.pop()
+        if segments:
+            num = int(LOG_SEGMENT_PATTERN.match(segments[-1]).group(1)) + 1
+        segment = self.out.with_name("{}.{:06d}".format(LOG_FILE, num))
+        self.storage.move(self.out, segment)
+        if not isinstance(self.storage, PosixStorage):
+            # segments stay plain, gzip needs real files
+            return
+        compressor = threading.Thread(target=_compress, args=(segment,), daemon=True)
+        compressor.start()
+        self.compressors.append(compressor)
 
     def flush(self):
         self.stream.flush()
 
     def close(self):
-        pass
+        for compressor in self.compressors:
+            compressor.join()
+        self.compressors = []
 
 
 class SafeExperiment(ExmanDirectory):
-    def __init__(self, root, run, extra_symlinks=(), prompt=False, default=True):
-        super().__init__(root, mode="validate")
+    def __init__(
+        self,
+        root,
+        run,
+        extra_symlinks=(),
+        prompt=False,
+        default=True,
+        heartbeat=HEARTBEAT_INTERVAL,
+        log_max_bytes=None,
+        profile=None,
+        storage=None,
+        move_to_fails=True,
+        params_hash=None,
+    ):
+        super().__init__(root, mode="validate", storage=storage)
+        self.move_to_fails = move_to_fails
+        self.params_hash = params_hash
         self.run = run
         self.extra_symlinks = extra_symlinks
         self.prompt = prompt
         self.default = default
+        self.heartbeat = heartbeat
+        self.log_max_bytes = log_max_bytes
+        self.profile = profile
+
+    def _beat(self, state="running"):
+        write_status(
+            self.run, state, self.started, self.heartbeat or None, storage=self.storage
+        )
 
     def __enter__(self):
-        self.stdout = _TeeOutput(sys.stdout, self.run / "log.txt")
+        self.started = datetime.datetime.now()
+        self._beat()
+        if self.heartbeat:
+            self.heartbeat_thread = _Periodic(self.heartbeat, self._beat)
+            self.heartbeat_thread.start()
+        else:
+            self.heartbeat_thread = None
+        if self.profile:
+            self.monitor = _ResourceMonitor(self.run, self.profile, self.storage)
+            self.monitor.start()
+        else:
+            self.monitor = None
+        self.stdout = _TeeOutput(
+            sys.stdout, self.run / LOG_FILE, self.log_max_bytes, self.storage
+        )
         self.redirect = contextlib.redirect_stdout(self.stdout)
         self.redirect.__enter__()
         return self
@@ -480,7 +1198,16 @@ class SafeExperiment(ExmanDirectory):
     def __exit__(self, exc_type, exc_val, exc_tb):
         self.redirect.__exit__(exc_type, exc_val, exc_tb)
         self.stdout.close()
-        if exc_type is not None:
+        if self.heartbeat_thread is not None:
+            self.heartbeat_thread.stop()
+        if self.monitor is not None:
+            self.monitor.stop()
+        if exc_type is None:
+            self._beat("finished")
+            self._summarize(self.run)
+            if self.params_hash is not None:
+                self.register_hash(self.params_hash, self.run.name)
+        else:
             critical = not issubclass(exc_type, KeyboardInterrupt)
             if not critical and self.prompt:
                 default = {True: "yes", False: "no"}[self.default]
@@ -491,22 +1218,83 @@ class SafeExperiment(ExmanDirectory):
                 except (inputimeout.TimeoutOccurred, termios_error, KeyboardInterrupt):
                     ans = default
                 critical = str2bool(ans, self.default)
-            if critical:
-                shutil.move(self.run, self.fails / self.run.name)
+            if critical and self.move_to_fails:
+                self.storage.move(self.run, self.fails / self.run.name)
+                links = []
                 for link in self.extra_symlinks:
-                    os.unlink(link)
+                    links.append(
+                        [
+                            os.path.relpath(str(link), str(self.root)),
+                            self.storage.readlink(link),
+                        ]
+                    )
+                    self.storage.unlink(link)
+                if links:
+                    self.storage.write_text(
+                        self.fails / self.run.name / LINKS_FILE, yaml.dump(links)
+                    )
                 tracefile = self.fails / self.run.name / "traceback.txt"
+                self._summarize(self.fails / self.run.name)
+                write_status(
+                    self.fails / self.run.name,
+                    "failed",
+                    self.started,
+                    None,
+                    storage=self.storage,
+                )
             else:
                 tracefile = self.run / "traceback.txt"
+                self._summarize(self.run)
+                self._beat("failed" if critical else "interrupted")
             trace = traceback.format_exception(exc_type, exc_val, exc_tb)
-            with tracefile.open("w") as f:
-                f.writelines(trace)
+            self.storage.write_text(tracefile, "".join(trace))
             print("\n".join(trace), file=sys.stdout)
             return not critical
 
-    def __call__(self, *, prompt=None, default=None):
+    def _summarize(self, run):
+        if self.monitor is not None:
+            self.monitor.summarize(run)
+
+    def save_artifact(self, source, name=None):
+        """
+        Save file or bytes to the run directory through the content addressed store,
+        identical artifacts across runs are kept on disk only once.
+        Returns path of the artifact inside the run directory.
+        """
+        if not isinstance(self.storage, PosixStorage):
+            raise NotImplementedError("artifacts need runs on a posix filesystem")
+        if isinstance(source, (bytes, bytearray)):
+            if name is None:
+                raise ValueError("name is required to save bytes")
+            digest = self.store_bytes(bytes(source))
+        else:
+            source = pathlib.Path(source)
+            if name is None:
+                name = source.name
+            digest = self.store_file(source)
+        target = self.run / name
+        target.parent.mkdir(parents=True, exist_ok=True)
+        if target.exists() or target.is_symlink():
+            target.unlink()
+        return self.link_blob(digest, target)
+
+    def __call__(
+        self,
+        *,
+        prompt=None,
+        default=None,
+        heartbeat=None,
+        log_max_bytes=None,
+        profile=None
+    ):
         if prompt is not None:
             self.prompt = prompt
         if default is not None:
             self.default = default
+        if heartbeat is not None:
+            self.heartbeat = heartbeat
+        if log_max_bytes is not None:
+            self.log_max_bytes = log_max_bytes
+        if profile is not None:
+            self.profile = profile
         return self
@@ -0,0 +1,140 @@
+import http.server
+import json
+import socketserver
+import threading
+import urllib.parse
+import uuid
+import zlib
+import pandas as pd
+from . import index as exindex
+
+try:
+    import pyarrow
+except ImportError:
+    pyarrow = None
+
+__all__ = ["make_server", "serve"]
+
+ARROW_CONTENT_TYPE = "application/vnd.apache.arrow.stream"
+
+
+class _ThreadingHTTPServer(socketserver.ThreadingMixIn, http.server.HTTPServer):
+    daemon_threads = True
+
+
+class IndexHandler(http.server.BaseHTTPRequestHandler):
+    """
+    GET /ids                     -> ids of indexed runs
+    GET /runs?since_id=N         -> raw records of runs with id > N
+    GET /runs?since_gen=N        -> raw records new or changed after generation N
+    GET /runs?ids=1,2,3          -> raw records of the given runs
+    GET /runs?<param>=<value>    -> records filtered by raw parameter value
+    `format=arrow` returns typed table as Arrow stream (requires pyarrow).
+    Responses carry ETag, `If-None-Match` gives 304 if nothing has changed.
+    Generation of the index is sent in `X-Exman-Generation` as `<token>-<N>`.
+    """
+
+    index = None
+    lock = None
+    # generation restarts with the server, the token keeps old ETags invalid
+    token = None
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        url = urllib.parse.urlsplit(self.path)
+        query = dict(urllib.parse.parse_qsl(url.query))
+        with self.lock:
+            self.index.refresh()
+            etag = '"{}-{}-{:x}"'.format(
+                self.token, self.index.generation, zlib.crc32(url.query.encode())
+            )
+            if self.headers.get("If-None-Match") == etag:
+                self.send_response(304)
+                self.send_header("ETag", etag)
+                self.end_headers()
+                return
+            if url.path == "/ids":
+                body = sorted(int(r["id"]) for r in self.index.records(refresh=False))
+                return self._send_json(body, etag)
+            if url.path != "/runs":
+                return self.send_error(404)
+            try:
+                records = self._select(query)
+            except ValueError as e:
+                return self.send_error(400, str(e))
+            if query.get("format", "json") == "json":
+                return self._send_json(records, etag)
+            if query["format"] != "arrow":
+                return self.send_error(400, "Unknown format")
+            if pyarrow is None:
+                return self.send_error(406, "pyarrow is not installed")
+            return self._send_arrow(records, etag)
+
+    def _select(self, query):
+        query = dict(query)
+        query.pop("format", None)
+        since_id = query.pop("since_id", None)
+        since_gen = query.pop("since_gen", None)
+        ids = query.pop("ids", None)
+        records = self.index.records(
+            None if since_id is None else int(since_id),
+            refresh=False,
+            since_gen=None if since_gen is None else int(since_gen),
+        )
+        if ids is not None:
+            ids = {int(i) for i in ids.split(",") if i}
+            records = [r for r in records if int(r["id"]) in ids]
+        for key, value in query.items():
+            records = [r for r in records if str(r.get(key)) == value]
+        return sorted(records, key=lambda r: int(r["id"]))
+
+    def _send(self, body, content_type, etag):
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header("ETag", etag)
+        self.send_header(
+            "X-Exman-Generation", "{}-{}".format(self.token, self.index.generation)
+        )
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_json(self, data, etag):
+        self._send(json.dumps(data).encode(), "application/json", etag)
+
+    def _send_arrow(self, records, etag):
+        if records:
+            df = self.index._frame(records)
+            df = df.assign(root=df.root.map(str))
+        else:
+            df = pd.DataFrame()
+        table = pyarrow.Table.from_pandas(df, preserve_index=False)
+        sink = pyarrow.BufferOutputStream()
+        with pyarrow.ipc.new_stream(sink, table.schema) as writer:
+            writer.write_table(table)
+        self._send(sink.getvalue().to_pybytes(), ARROW_CONTENT_TYPE, etag)
+
+
+def make_server(root, host="127.0.0.1", port=8765):
+    """HTTP server answering queries from one cached and incrementally updated Index"""
+    handler = type(
+        "IndexHandler",
+        (IndexHandler,),
+        dict(
+            index=exindex.Index(root), lock=threading.Lock(), token=uuid.uuid4().hex[:8]
+        ),
+    )
+    return _ThreadingHTTPServer((host, port), handler)
+
+
+def serve(root, host="127.0.0.1", port=8765):
+    server = make_server(root, host, port)
+    print("Serving {} on http://{}:{}".format(root, *server.server_address))
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
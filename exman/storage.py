@@ -0,0 +1,355 @@
+import io
+import os
+import pathlib
+import posixpath
+import shutil
+import threading
+from filelock import FileLock
+
+__all__ = ["Storage", "PosixStorage", "MemoryStorage", "POSIX"]
+
+
+class Storage(object):
+    """
+    Operations exman needs from the place where runs are kept: directory
+    allocation, reading and writing metadata, symlinks for index and marks and
+    moves between runs, tmp and fails. Paths are `pathlib.Path` objects.
+    """
+
+    def exists(self, path):
+        raise NotImplementedError
+
+    def is_dir(self, path):
+        raise NotImplementedError
+
+    def is_symlink(self, path):
+        raise NotImplementedError
+
+    def makedirs(self, path):
+        """Create directory with parents, existing one is ok"""
+        raise NotImplementedError
+
+    def mkdir(self, path):
+        """Create directory, raises FileExistsError if it exists"""
+        raise NotImplementedError
+
+    def listdir(self, path):
+        raise NotImplementedError
+
+    def read_text(self, path):
+        raise NotImplementedError
+
+    def open_binary(self, path):
+        """Binary file object for reading, e.g. logs and artifacts"""
+        raise NotImplementedError
+
+    def write_text(self, path, text):
+        """Replace file content atomically, readers see the old or the new one"""
+        raise NotImplementedError
+
+    def append_text(self, path, text):
+        raise NotImplementedError
+
+    def symlink(self, link, target, replace=False):
+        raise NotImplementedError
+
+    def readlink(self, link):
+        raise NotImplementedError
+
+    def resolve(self, path):
+        raise NotImplementedError
+
+    def unlink(self, path):
+        raise NotImplementedError
+
+    def move(self, src, dst):
+        raise NotImplementedError
+
+    def rmtree(self, path):
+        raise NotImplementedError
+
+    def lock(self, path):
+        """Context manager for exclusive access across processes using it"""
+        raise NotImplementedError
+
+
+class PosixStorage(Storage):
+    """Local or mounted filesystem"""
+
+    def exists(self, path):
+        return os.path.exists(str(path))
+
+    def is_dir(self, path):
+        return os.path.isdir(str(path))
+
+    def is_symlink(self, path):
+        return os.path.islink(str(path))
+
+    def makedirs(self, path):
+        os.makedirs(str(path), exist_ok=True)
+
+    def mkdir(self, path):
+        os.mkdir(str(path))
+
+    def listdir(self, path):
+        return os.listdir(str(path))
+
+    def read_text(self, path):
+        with open(str(path)) as f:
+            return f.read()
+
+    def open_binary(self, path):
+        return open(str(path), "rb")
+
+    def write_text(self, path, text):
+        path = str(path)
+        tmpname = os.path.join(
+            os.path.dirname(path), ".{}.{}".format(os.path.basename(path), os.getpid())
+        )
+        with open(tmpname, "w") as f:
+            f.write(text)
+            # otherwise the rename may reach the disk before the data
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmpname, path)
+
+    def append_text(self, path, text):
+        with open(str(path), "a") as f:
+            f.write(text)
+            return f.tell()
+
+    def symlink(self, link, target, replace=False):
+        if replace:
+            tmplink = "{}.{}.tmp".format(link, os.getpid())
+            os.symlink(str(target), tmplink)
+            os.replace(tmplink, str(link))
+        else:
+            os.symlink(str(target), str(link))
+
+    def readlink(self, link):
+        return os.readlink(str(link))
+
+    def resolve(self, path):
+        return pathlib.Path(path).resolve()
+
+    def unlink(self, path):
+        os.unlink(str(path))
+
+    def move(self, src, dst):
+        shutil.move(str(src), str(dst))
+
+    def rmtree(self, path):
+        shutil.rmtree(str(path))
+
+    def lock(self, path):
+        return FileLock(str(path))
+
+
+POSIX = PosixStorage()
+
+
+class MemoryStorage(Storage):
+    """
+    Storage in dicts, for tests and benchmarks. Shared between threads of
+    one process only, blobs, packs and compressed logs are not supported.
+    """
+
+    MAX_LINKS = 40
+
+    def __init__(self):
+        # directory -> names in it, so listing does not scan the whole store
+        self.dirs = {"/": set()}
+        self.files = {}
+        self.links = {}
+        self._lock = threading.RLock()
+
+    def __getstate__(self):
+        # worker processes get a snapshot for reading
+        state = self.__dict__.copy()
+        del state["_lock"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.RLock()
+
+    @staticmethod
+    def _norm(path):
+        return posixpath.normpath(posixpath.join("/", str(path)))
+
+    def _resolve(self, path, follow_last=True):
+        parts = self._norm(path).strip("/").split("/")
+        current = "/"
+        depth = 0
+        while parts:
+            part = parts.pop(0)
+            if not part:
+                continue
+            candidate = posixpath.join(current, part)
+            if candidate in self.links and (parts or follow_last):
+                depth += 1
+                if depth > self.MAX_LINKS:
+                    raise OSError("Too many levels of symbolic links", str(path))
+                target = self._norm(posixpath.join(current, self.links[candidate]))
+                parts = target.strip("/").split("/") + parts
+                current = "/"
+            else:
+                current = candidate
+        return current
+
+    def _parent_dir(self, path):
+        parent = self._resolve(posixpath.dirname(self._norm(path)))
+        if parent not in self.dirs:
+            raise FileNotFoundError(str(path))
+        return posixpath.join(parent, posixpath.basename(self._norm(path)))
+
+    def _taken(self, path):
+        return path in self.dirs or path in self.files or path in self.links
+
+    def _add(self, path):
+        parent, name = posixpath.split(path)
+        self.dirs[parent].add(name)
+
+    def _discard(self, path):
+        parent, name = posixpath.split(path)
+        self.dirs[parent].discard(name)
+
+    def _walk(self, path):
+        """Everything below the directory, symlinks are not followed"""
+        for name in self.dirs[path]:
+            child = posixpath.join(path, name)
+            yield child
+            if child in self.dirs:
+                yield from self._walk(child)
+
+    def exists(self, path):
+        with self._lock:
+            resolved = self._resolve(path)
+            return resolved in self.dirs or resolved in self.files
+
+    def is_dir(self, path):
+        with self._lock:
+            return self._resolve(path) in self.dirs
+
+    def is_symlink(self, path):
+        with self._lock:
+            return self._resolve(path, follow_last=False) in self.links
+
+    def makedirs(self, path):
+        with self._lock:
+            current = "/"
+            for part in self._resolve(path).strip("/").split("/"):
+                if not part:
+                    continue
+                current = self._resolve(posixpath.join(current, part))
+                if current in self.files:
+                    raise FileExistsError(str(path))
+                if current not in self.dirs:
+                    self.dirs[current] = set()
+                    self._add(current)
+
+    def mkdir(self, path):
+        with self._lock:
+            path = self._parent_dir(path)
+            if self._taken(path):
+                raise FileExistsError(str(path))
+            self.dirs[path] = set()
+            self._add(path)
+
+    def listdir(self, path):
+        with self._lock:
+            path = self._resolve(path)
+            if path not in self.dirs:
+                raise FileNotFoundError(str(path))
+            return list(self.dirs[path])
+
+    def read_text(self, path):
+        with self._lock:
+            try:
+                return self.files[self._resolve(path)]
+            except KeyError:
+                raise FileNotFoundError(str(path))
+
+    def open_binary(self, path):
+        return io.BytesIO(self.read_text(path).encode())
+
+    def _write(self, path, text):
+        if path in self.dirs:
+            raise IsADirectoryError(str(path))
+        if path not in self.files:
+            self._add(path)
+        self.files[path] = text
+
+    def write_text(self, path, text):
+        with self._lock:
+            self._write(self._parent_dir(self._resolve(path)), text)
+
+    def append_text(self, path, text):
+        with self._lock:
+            path = self._parent_dir(self._resolve(path))
+            self._write(path, self.files.get(path, "") + text)
+            return len(self.files[path].encode())
+
+    def symlink(self, link, target, replace=False):
+        with self._lock:
+            link = self._parent_dir(link)
+            if self._taken(link) and not (replace and link in self.links):
+                raise FileExistsError(link)
+            if link not in self.links:
+                self._add(link)
+            self.links[link] = str(target)
+
+    def readlink(self, link):
+        with self._lock:
+            try:
+                return self.links[self._resolve(link, follow_last=False)]
+            except KeyError:
+                raise OSError("Not a symbolic link", str(link))
+
+    def resolve(self, path):
+        with self._lock:
+            return pathlib.Path(self._resolve(path))
+
+    def unlink(self, path):
+        with self._lock:
+            path = self._resolve(path, follow_last=False)
+            if path in self.links:
+                del self.links[path]
+            elif path in self.files:
+                del self.files[path]
+            else:
+                raise FileNotFoundError(str(path))
+            self._discard(path)
+
+    def move(self, src, dst):
+        with self._lock:
+            src = self._resolve(src, follow_last=False)
+            dst = self._parent_dir(dst)
+            if not self._taken(src):
+                raise FileNotFoundError(src)
+            if self._taken(dst):
+                raise FileExistsError(dst)
+            below = list(self._walk(src)) if src in self.dirs else []
+            for name in [src] + below:
+                renamed = dst + name[len(src) :]
+                for mapping in (self.dirs, self.files, self.links):
+                    if name in mapping:
+                        # children are kept by name, they move along
+                        mapping[renamed] = mapping.pop(name)
+            self._discard(src)
+            self._add(dst)
+
+    def rmtree(self, path):
+        with self._lock:
+            path = self._resolve(path)
+            if path not in self.dirs:
+                raise FileNotFoundError(str(path))
+            for name in list(self._walk(path)):
+                for mapping in (self.dirs, self.files, self.links):
+                    mapping.pop(name, None)
+            del self.dirs[path]
+            self._discard(path)
+
+    def lock(self, path):
+        # one process only, a reentrant lock is enough
+        return self._lock
@@ -1,5 +1,7 @@
 import exman
 import pytest
+import datetime
+import subprocess
 
 # fixtures:
 #   parser: exman.ExParser
@@ -37,3 +39,77 @@ def test_delete_all(parser: exman.ExParser, script_runner, root):
     assert r"runs {2} were not found" in info1.stderr
     assert not (parser.index / exman.parser.yaml_file(args.root.name)).exists()
     assert not (parser.runs / args.root.name).exists()
+
+
+def test_pack_cat(parser: exman.ExParser, script_runner, root):
+    # output is written as bytes, in process runner captures text only
+    script_runner.launch_mode = "subprocess"
+    args = parser.parse_args([])
+    data = bytes(range(256))
+    (args.root / "model.bin").write_bytes(data)
+    info = script_runner.run("exman", "pack", "--older-than", "0", cwd=root)
+    assert info.success
+    assert not args.root.exists()
+    info = script_runner.run("exman", "cat", "1", cwd=root)
+    assert info.success
+    assert "id: 1" in info.stdout
+    cat = subprocess.run(
+        ["exman", "cat", "1", "model.bin"], cwd=str(root), stdout=subprocess.PIPE
+    )
+    assert cat.returncode == 0
+    assert cat.stdout == data
+    info = script_runner.run("exman", "cat", "2", cwd=root)
+    assert not info.success
+
+
+def test_ls(parser: exman.ExParser, script_runner, root):
+    script_runner.launch_mode = "in_process"
+    parser.parse_args(["--name", "foo"])
+    parser.parse_args(["--tmp"])
+    info = script_runner.run(
+        "exman", "ls", "--last", "1", "--state", "run", "--status", cwd=root
+    )
+    assert info.success
+    assert "foo" in info.stdout
+    assert "tmp" not in info.stdout
+    assert "status" in info.stdout
+
+
+def test_tail(parser: exman.ExParser, script_runner, root):
+    script_runner.launch_mode = "in_process"
+    args = parser.parse_args([])
+    with args.safe_experiment(log_max_bytes=50):
+        for i in range(20):
+            print("line", i)
+    info = script_runner.run("exman", "tail", "1", "-n", "2", cwd=root)
+    assert info.success
+    assert info.stdout == "line 18\nline 19\n"
+    exman.pack.pack_runs(parser, datetime.timedelta(0))
+    info = script_runner.run("exman", "tail", "1", "-n", "12", cwd=root)
+    assert info.success
+    assert info.stdout.splitlines() == ["line {}".format(i) for i in range(8, 20)]
+
+
+def test_ls_roots(parser: exman.ExParser, script_runner, root, tmp_path):
+    script_runner.launch_mode = "in_process"
+    other = exman.ExParser(root=tmp_path / "other")
+    parser.parse_args([])
+    other.parse_args(["--name", "foo"])
+    info = script_runner.run(
+        "exman", "ls", "--roots", str(root), str(other.root), cwd=tmp_path
+    )
+    assert info.success
+    assert str(other.root) in info.stdout
+    assert "foo" in info.stdout
+
+
+def test_resume(parser: exman.ExParser, script_runner, root):
+    script_runner.launch_mode = "in_process"
+    args = parser.parse_args([])
+    with pytest.raises(ValueError), args.safe_experiment:
+        raise ValueError
+    info = script_runner.run("exman", "resume", "1", cwd=root)
+    assert info.success
+    assert args.root.exists()
+    assert (parser.index / exman.parser.yaml_file(args.root.name)).exists()
+    assert len(exman.Index(root).info()) == 1
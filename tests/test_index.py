@@ -3,6 +3,9 @@ import pytest
 import exman
 import random
 import time
+import datetime
+import asyncio
+import pandas as pd
 
 # fixtures:
 #   parser: exman.ExParser
@@ -115,3 +118,258 @@ def test_nans(root: pathlib.Path):
     assert str(info.dtypes["arg3"]) == "float64"
     assert str(info.dtypes["arg4"]) == "object"
     assert info.arg4.iloc[-1] == "1"
+
+
+def test_packed(parser: exman.ExParser, script_runner, root):
+    parser.parse_args("--arg1=10 --arg2=F".split())
+    args = parser.parse_args("--arg1=9 --arg2=t".split())
+    (args.root / "result.txt").write_text("42")
+    assert script_runner.run("exman", "mark", "new", "2", cwd=root).success
+    before = exman.Index(parser.root).info()
+    segments = exman.pack.pack_runs(parser, datetime.timedelta(0), segment_size=1)
+    assert len(segments) == 2
+    assert not list(parser.runs.iterdir())
+    index = exman.Index(parser.root)
+    after = index.info()
+    assert after.root.equals(before.root)
+    assert after.pack_segment.tolist() == segments
+    assert not after.root[0].exists()
+    assert after.drop(columns="pack_segment").equals(before)
+    assert index.info("new").id.tolist() == [2]
+    assert index.info(compact=True).pack_segment.tolist() == [
+        str(segment.relative_to(root)) for segment in segments
+    ]
+    assert index.read_file(2, "result.txt") == "42"
+    assert parser.next_ex() == 3
+
+
+def test_compact(parser: exman.ExParser):
+    parser.add_argument("--model", default="resnet")
+    parser.add_argument("--lr", default=0.1, type=float)
+    parser.add_argument("--list", nargs=2, type=int, default=None)
+    for i in range(4):
+        parser.parse_args("--arg1={}".format(i).split())
+    args = parser.parse_args("--list 1 4 --lr 0.5".split())
+    index = exman.Index(parser.root)
+    full = index.info()
+    info = index.info(compact=True)
+    assert str(info.dtypes.model) == "category"
+    assert str(info.dtypes.arg1) == "int8"
+    assert str(info.dtypes.arg2) == "bool"
+    # 0.1 is not representable in float32 exactly
+    assert str(info.dtypes.lr) == "float64"
+    assert isinstance(info.dtypes.list, pd.SparseDtype)
+    assert info.list.iloc[-1] == [1, 4]
+    assert index.path(info.root.iloc[-1]) == args.root
+    assert info.memory_usage(deep=True).sum() < full.memory_usage(deep=True).sum()
+
+
+def test_list_runs(parser: exman.ExParser):
+    parser.parse_args([])
+    args = parser.parse_args(["--name", "foo-bar"])
+    parser.parse_args(["--tmp"])
+    with pytest.raises(ValueError), args.safe_experiment:
+        raise ValueError
+    index = exman.Index(parser.root)
+    runs = index.list_runs()
+    assert runs.id.tolist() == [1, 2, 3]
+    assert runs.state.tolist() == ["run", "fail", "tmp"]
+    assert runs.tag.tolist() == ["", "foo-bar", ""]
+    assert str(runs.dtypes.time) == "datetime64[ns]"
+    assert index.list_runs(min_id=2, states=["run", "fail"]).id.tolist() == [2]
+    assert len(index.list_runs(until=datetime.datetime(2000, 1, 1))) == 0
+    exman.pack.pack_runs(parser, datetime.timedelta(0))
+    assert index.list_runs(states=["pack"]).id.tolist() == [1]
+
+
+def test_status_column(parser: exman.ExParser):
+    args = parser.parse_args([])
+    with args.safe_experiment:
+        pass
+    parser.parse_args([])
+    index = exman.Index(parser.root)
+    assert index.info().status.tolist() == ["finished", None]
+    assert index.list_runs(status=True).status.tolist() == ["finished", None]
+    exman.pack.pack_runs(parser, datetime.timedelta(0))
+    assert index.info().status.tolist() == ["finished", None]
+
+
+def test_cache_sees_packed_runs(parser: exman.ExParser):
+    for i in range(3):
+        parser.parse_args([])
+    index = exman.Index(parser.root)
+    assert "pack_segment" not in index.info(cached=True)
+    exman.pack.pack_runs(parser, datetime.timedelta(0), segment_size=2)
+    segments = [str(segment) for segment in sorted(parser.packs.iterdir())]
+    info = index.info(cached=True)
+    assert info.pack_segment.astype(str).tolist() == [segments[0]] * 2 + [segments[1]]
+    # a new index starts from the saved summary
+    info = exman.Index(parser.root).info(cached=True)
+    assert info.pack_segment.astype(str).tolist() == [segments[0]] * 2 + [segments[1]]
+
+
+def test_pack_skips_alive(parser: exman.ExParser):
+    args = parser.parse_args([])
+    stale = parser.parse_args([])
+    exman.parser.write_status(
+        stale.root, "running", datetime.datetime.now(), interval=0.01
+    )
+    with args.safe_experiment(heartbeat=0):
+        time.sleep(0.1)
+        assert exman.pack.pack_runs(parser, datetime.timedelta(0)) == []
+        index = exman.Index(parser.root)
+        assert index.list_runs(status=True).status.tolist() == ["running", "stale"]
+        assert len(exman.pack.pack_runs(parser, datetime.timedelta(0), force=True)) == 1
+        assert args.root.exists()
+        assert index.list_runs(states=["pack"]).id.tolist() == [2]
+
+
+def test_ainfo(parser: exman.ExParser):
+    for i in range(5):
+        parser.parse_args("--arg1={}".format(i).split())
+    exman.pack.pack_runs(parser, datetime.timedelta(0), segment_size=2)
+    parser.parse_args("--arg1=10 --arg2=F".split())
+    index = exman.Index(parser.root)
+    info = index.info()
+    ainfo = asyncio.get_event_loop().run_until_complete(
+        index.ainfo(concurrency=2, batch_size=2)
+    )
+    pd.testing.assert_frame_equal(info, ainfo)
+    with pytest.raises(KeyError):
+        asyncio.get_event_loop().run_until_complete(index.ainfo("missing"))
+
+
+def test_multi_index(tmp_path):
+    roots = dict(a=tmp_path / "a", b=tmp_path / "b")
+    parser_a = exman.ExParser(root=roots["a"])
+    parser_a.add_argument("--arg1", default=1, type=int)
+    parser_b = exman.ExParser(root=roots["b"])
+    parser_b.add_argument("--arg1", default=1, type=float)
+    parser_b.add_argument("--arg3", default="x")
+    args_a = parser_a.parse_args([])
+    args_b = parser_b.parse_args(["--arg1", "1.5"])
+    index = exman.MultiIndex(roots)
+    info = index.info()
+    assert info.columns[:2].tolist() == ["root_label", "id"]
+    assert info.root_label.tolist() == ["a", "b"]
+    assert info.root.tolist() == [args_a.root, args_b.root]
+    assert str(info.dtypes.arg1) == "float64"
+    assert info.arg3.isna().tolist() == [True, False]
+    parser_a.parse_args([])
+    assert len(index.info()) == 3
+    runs = index.list_runs()
+    assert runs.root_label.tolist() == ["a", "a", "b"]
+    assert runs.id.tolist() == [1, 2, 1]
+
+
+@pytest.mark.parametrize("cached", [True, False])
+def test_multi_index_labels(tmp_path, cached):
+    labels = ["2023", "1", "yes"]
+    roots = {label: tmp_path / label for label in labels}
+    for root in roots.values():
+        exman.ExParser(root=root).parse_args([])
+    info = exman.MultiIndex(roots, njobs=2).info(cached=cached)
+    assert info.root_label.tolist() == labels
+    assert info.root.tolist() == [
+        exman.Index(root).find_run(1) for root in roots.values()
+    ]
+    assert "_root_pos" not in info.columns
+
+
+def test_resources_columns(parser: exman.ExParser):
+    args = parser.parse_args([])
+    with args.safe_experiment(profile=1):
+        pass
+    parser.parse_args([])
+    info = exman.Index(parser.root).info()
+    assert str(info.dtypes.res_max_rss) == "float64"
+    assert info.res_max_rss[0] > 0
+    assert info.res_wall_time.isna().tolist() == [False, True]
+
+
+def test_describe(parser: exman.ExParser, script_runner, root):
+    parser.add_argument("--model", default="resnet")
+    parser.parse_args("--arg1=10".split())
+    parser.parse_args("--arg1=9 --model=vgg".split())
+    parser.parse_args("--arg1=11".split())
+    index = exman.Index(parser.root)
+    summary = index.describe()
+    assert summary.loc["arg1", "min"] == 9
+    assert summary.loc["arg1", "max"] == 11
+    assert summary.loc["arg1", "distinct"] == 3
+    assert summary.loc["model", "values"] == {"resnet": 2, "vgg": 1}
+    assert summary.loc["arg2", "distinct"] == 1
+    assert "arg2" not in index.varying_columns()
+    assert {"arg1", "model"} <= set(index.varying_columns())
+    assert "id" not in index.varying_columns()
+    script_runner.launch_mode = "in_process"
+    assert script_runner.run("exman", "delete", "2", cwd=root).success
+    parser.add_argument("--arg3", default=1)
+    parser.parse_args([])
+    summary = index.describe()
+    assert summary.loc["model", "values"] == {"resnet": 3}
+    assert summary.loc["arg3", "missing"] == 2
+    assert "model" not in index.varying_columns()
+    assert "arg3" in index.varying_columns()
+
+
+def test_half_written_params(parser: exman.ExParser):
+    roots = [parser.parse_args(["--arg1", str(i)]).root for i in range(3)]
+    params = [root / exman.parser.PARAMS_FILE for root in roots]
+    # cut before the id line and in the middle of quoted time
+    text = params[1].read_text()
+    params[1].write_text(text[: text.index("id:")])
+    text = params[2].read_text()
+    params[2].write_text(text[: text.index("time:") + 10])
+    index = exman.Index(parser.root)
+    with pytest.warns(UserWarning, match="broken"):
+        assert index.info().id.tolist() == [1]
+    with pytest.warns(UserWarning, match="broken"):
+        assert index.info(cached=True).id.tolist() == [1]
+    with pytest.raises(ValueError):
+        index.info(errors="raise")
+    with pytest.warns(UserWarning, match="repaired"):
+        info = index.info(errors="repair")
+    assert info.id.tolist() == [1, 2, 3]
+    assert info.arg1.tolist() == [0, 1, 2]
+    assert info.root.tolist() == roots
+    assert info.time[2] == exman.parser.parse_dir_name(roots[2].name).time
+
+
+def test_varying_ignores_run_columns(parser: exman.ExParser):
+    for i in range(2):
+        args = parser.parse_args([])
+        with args.safe_experiment(profile=0.1):
+            pass
+    parser.parse_args([])
+    index = exman.Index(parser.root)
+    assert "res_wall_time" in index.describe().index
+    assert index.varying_columns() == []
+
+
+def test_describe_saved_summary(parser: exman.ExParser, monkeypatch):
+    parser.add_argument("--model", default="resnet")
+    for model in ["resnet", "vgg", "vgg"]:
+        parser.parse_args(["--model", model])
+    running = parser.parse_args(["--arg1", "3"])
+    with running.safe_experiment:
+        assert exman.Index(parser.root).describe().loc["status", "values"] == {
+            "running": 1
+        }
+    (parser.index / exman.parser.yaml_file(parser.find_run(2).name)).unlink()
+    parser.parse_args(["--model", "alexnet"])
+    reads = []
+    read_record = exman.index.read_record
+    monkeypatch.setattr(
+        exman.index,
+        "read_record",
+        lambda *args: reads.append(args[0]) or read_record(*args),
+    )
+    index = exman.Index(parser.root)
+    summary = index.describe()
+    # the new run and the finished one
+    assert len(reads) == 2
+    assert summary.loc["status", "values"] == {"finished": 1}
+    assert index.varying_columns() == ["arg1", "model"]
+    parser.root.joinpath(exman.parser.SUMMARY_FILE).unlink()
+    pd.testing.assert_frame_equal(exman.Index(parser.root).describe(), summary)
@@ -1,11 +1,22 @@
 import argparse
+import os
+import yaml
 import exman
 import pytest
+import time
+import datetime
+import subprocess
+import sys
 
 # fixtures:
 #   parser: exman.ExParser
 
 
+def _finish(args):
+    with args.safe_experiment:
+        pass
+
+
 def test_dirs(parser: exman.ExParser):
     args = parser.parse_args([])
     assert args.root.exists()
@@ -210,3 +221,256 @@ def test_redirect(root):
     with args.safe_experiment:
         print("hello")
     assert "hello" in (args.root / "log.txt").read_text()
+
+
+def test_save_artifact(root, tmp_path):
+    parser = exman.ExParser(root=root)
+    args1 = parser.parse_args([])
+    args2 = parser.parse_args([])
+    source = tmp_path / "vocab.txt"
+    source.write_text("a\nb\n")
+    path1 = args1.safe_experiment.save_artifact(source)
+    path2 = args2.safe_experiment.save_artifact(source, "data/vocab.txt")
+    path3 = args2.safe_experiment.save_artifact(b"a\nb\n", "bytes.txt")
+    assert path1 == args1.root / "vocab.txt"
+    assert path2 == args2.root / "data" / "vocab.txt"
+    assert path1.read_text() == path2.read_text() == path3.read_text() == "a\nb\n"
+    assert len(list(parser.objects.glob("*/*"))) == 1
+
+
+def test_git_diff_deduplicated(root, tmp_path):
+    import git
+
+    repo = git.Repo.init(tmp_path)
+    (tmp_path / "file.txt").write_text("a")
+    repo.index.add(["file.txt"])
+    repo.index.commit("init")
+    (tmp_path / "file.txt").write_text("b")
+    parser = exman.ExParser(root=root, git=str(tmp_path))
+    args1 = parser.parse_args([])
+    args2 = parser.parse_args([])
+    diff1 = args1.root / exman.parser.DIFF_FILE
+    diff2 = args2.root / exman.parser.DIFF_FILE
+    assert "+b" in diff1.read_text()
+    assert diff1.read_text() == diff2.read_text()
+    assert len(list(parser.objects.glob("*/*"))) == 1
+
+
+def test_params_hash_code_changes(root, tmp_path):
+    import git
+
+    repo = git.Repo.init(tmp_path)
+    (tmp_path / "file.txt").write_text("a")
+    repo.index.add(["file.txt"])
+    repo.index.commit("init")
+    parser = exman.ExParser(root=root, git=str(tmp_path), duplicates="skip")
+    _finish(parser.parse_args([]))
+    with pytest.raises(SystemExit):
+        parser.parse_args([])
+    (tmp_path / "file.txt").write_text("b")
+    _finish(parser.parse_args([]))
+    with pytest.raises(SystemExit):
+        parser.parse_args([])
+    repo.index.add(["file.txt"])
+    repo.index.commit("change")
+    parser.parse_args([])
+    assert parser.num_ex() == 3
+
+
+def test_reused_run_not_moved(root):
+    parser = exman.ExParser(root=root, duplicates="reuse")
+    args = parser.parse_args([])
+    with args.safe_experiment:
+        pass
+    args = parser.parse_args([])
+    with pytest.raises(ValueError), args.safe_experiment:
+        raise ValueError
+    assert args.root.exists()
+    assert exman.parser.run_status(args.root) == "failed"
+    assert exman.Index(root).info().id.tolist() == [1]
+
+
+def test_params_hash(root):
+    parser = exman.ExParser(root=root)
+    parser.add_argument("--arg1", default=1, type=int)
+    parser.add_argument("--seed", default=1, type=int, volatile=True)
+    args1 = parser.parse_args(["--seed", "2"])
+    args2 = parser.parse_args(["--name", "other"])
+    args3 = parser.parse_args(["--arg1", "2"])
+    hash1 = parser.params_hash(args1)
+    assert hash1 == parser.params_hash(args2)
+    assert hash1 != parser.params_hash(args3)
+    assert "params_hash: {}".format(hash1) in (args1.root / "params.yaml").read_text()
+    # only finished runs are registered
+    assert parser.find_duplicate(hash1) is None
+    _finish(args2)
+    assert parser.find_duplicate(hash1) == args2.root.name
+
+
+def test_duplicate_survives_failed_rerun(root):
+    parser = exman.ExParser(root=root, duplicates="warn")
+    args1 = parser.parse_args([])
+    _finish(args1)
+    params_hash = parser.params_hash(args1)
+    args2 = parser.parse_args([])
+    with pytest.raises(ValueError), args2.safe_experiment:
+        raise ValueError
+    assert (parser.fails / args2.root.name).exists()
+    assert parser.find_duplicate(params_hash) == args1.root.name
+
+
+def test_unfinished_runs_are_not_duplicates(root):
+    parser = exman.ExParser(root=root, duplicates="skip")
+    args = parser.parse_args([])
+    _finish(args)
+    # crashed (stale) after it was resumed
+    exman.parser.write_status(args.root, "running", datetime.datetime.now(), 0.01)
+    time.sleep(0.1)
+    assert parser.find_duplicate(parser.params_hash(args)) is None
+    assert parser.parse_args([]).root != args.root
+
+
+@pytest.mark.parametrize("policy", ["warn", "skip", "reuse"])
+def test_duplicates(root, capsys, policy):
+    parser = exman.ExParser(root=root, duplicates=policy)
+    parser.add_argument("--arg1", default=1, type=int)
+    args1 = parser.parse_args([])
+    _finish(args1)
+    if policy == "skip":
+        with pytest.raises(SystemExit):
+            parser.parse_args([])
+        assert parser.num_ex() == 1
+    elif policy == "reuse":
+        args2 = parser.parse_args([])
+        assert args2.root == args1.root
+        assert parser.num_ex() == 1
+    else:
+        args2 = parser.parse_args([])
+        assert args2.root != args1.root
+        assert "warning" in capsys.readouterr()[1]
+    # failed runs are not considered
+    args3 = parser.parse_args(["--arg1", "2"])
+    with pytest.raises(ValueError), args3.safe_experiment:
+        raise ValueError
+    args4 = parser.parse_args(["--arg1", "2"])
+    assert args4.root != args3.root
+
+
+def test_status(root):
+    parser = exman.ExParser(root=root)
+    args = parser.parse_args([])
+    status = args.root / exman.parser.STATUS_FILE
+    assert exman.parser.run_status(args.root) is None
+    with args.safe_experiment(heartbeat=0.1):
+        assert exman.parser.run_status(args.root) == "running"
+        time.sleep(0.5)
+        assert exman.parser.run_status(args.root) == "running"
+    assert exman.parser.run_status(args.root) == "finished"
+    args = parser.parse_args([])
+    with pytest.raises(ValueError), args.safe_experiment:
+        raise ValueError
+    assert exman.parser.run_status(parser.fails / args.root.name) == "failed"
+    args = parser.parse_args([])
+    with args.safe_experiment:
+        raise KeyboardInterrupt
+    assert exman.parser.run_status(args.root) == "interrupted"
+
+
+def test_stale_status(root):
+    started = datetime.datetime.now()
+    exman.parser.write_status(root, "running", started, interval=1)
+    status = (root / exman.parser.STATUS_FILE).read_text()
+    later = started + datetime.timedelta(seconds=10)
+    assert exman.parser.read_status(status) == "running"
+    assert exman.parser.read_status(status, later) == "stale"
+    # no heartbeat thread, nothing to judge by
+    exman.parser.write_status(root, "running", started, interval=None)
+    status = (root / exman.parser.STATUS_FILE).read_text()
+    assert exman.parser.read_status(status, later) == "running"
+
+
+def test_log_rotation(root):
+    parser = exman.ExParser(root=root)
+    args = parser.parse_args([])
+    with args.safe_experiment(log_max_bytes=100):
+        for i in range(100):
+            print("line", i)
+    files = exman.parser._log_segments(os.listdir(args.root))
+    assert len(files) > 5
+    assert all(name.endswith(".gz") for name in files[:-1])
+    assert files[-1] == "log.txt"
+    full = exman.parser.read_run_log(args.root)
+    assert full == "".join("line {}\n".format(i) for i in range(100))
+    for n in (0, 1, 3, 30, 100, 1000):
+        assert exman.parser.read_run_log(args.root, n) == "".join(
+            full.splitlines(keepends=True)[-n:] if n else []
+        )
+
+
+@pytest.mark.parametrize("in_child", [False, True])
+def test_profile_max_rss_per_run(root, in_child):
+    parser = exman.ExParser(root=root)
+    summaries = []
+    for size in (300 << 20, 0):
+        args = parser.parse_args([])
+        with args.safe_experiment(profile=0.05):
+            if in_child:
+                code = "import time; data = bytearray({}); time.sleep(0.2)"
+                subprocess.run([sys.executable, "-c", code.format(size)], check=True)
+            else:
+                data = bytearray(size)
+                time.sleep(0.2)
+                del data
+        resources = (args.root / exman.parser.RESOURCES_FILE).read_text()
+        summaries.append(yaml.safe_load(resources))
+    # the peak of the first run is not reported by the second one
+    assert summaries[0]["max_rss"] - summaries[1]["max_rss"] > 200 << 20
+
+
+def test_profile(root):
+    parser = exman.ExParser(root=root)
+    args = parser.parse_args([])
+    with args.safe_experiment(profile=0.05):
+        sum(i * i for i in range(10**6))
+        time.sleep(0.2)
+    summary = yaml.safe_load((args.root / exman.parser.RESOURCES_FILE).read_text())
+    assert summary["wall_time"] >= 0.2
+    assert summary["cpu_user"] > 0
+    assert summary["max_rss"] > 0
+    series = (args.root / exman.parser.RESOURCES_SERIES_FILE).read_text().splitlines()
+    assert series[0].startswith("elapsed,")
+    assert len(series) > 3
+    args = parser.parse_args([])
+    with pytest.raises(ValueError), args.safe_experiment(profile=0.05):
+        raise ValueError
+    assert (parser.fails / args.root.name / exman.parser.RESOURCES_FILE).exists()
+
+
+def test_resume(root):
+    parser = exman.ExParser(root=root, automark=["arg1"])
+    parser.add_argument("--arg1", default=1, type=int)
+    parser.add_argument("--seed", default=0, type=int, volatile=True)
+    args = parser.parse_args(["--arg1", "2", "--seed", "3"])
+    with pytest.raises(ValueError), args.safe_experiment:
+        (args.root / "checkpoint").write_text("epoch 1")
+        raise ValueError
+    assert not args.root.exists()
+    resumed = parser.resume(1)
+    assert resumed.root == args.root
+    assert resumed.arg1 == 2
+    assert resumed.seed == 0
+    assert (resumed.root / "checkpoint").read_text() == "epoch 1"
+    assert (parser.index / exman.parser.yaml_file(args.root.name)).exists()
+    assert (parser.marked / "arg1" / "2" / args.root.name).exists()
+    assert parser.next_ex() == 2
+    with resumed.safe_experiment:
+        pass
+    assert exman.parser.run_status(args.root) == "finished"
+
+
+def test_params_written_once(parser: exman.ExParser, capsys):
+    args = parser.parse_args([])
+    params = (args.root / exman.parser.PARAMS_FILE).read_text()
+    assert params in capsys.readouterr().out
+    assert params.endswith("id: 1\n")
+    assert os.listdir(str(args.root)) == [exman.parser.PARAMS_FILE]
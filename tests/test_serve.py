@@ -0,0 +1,63 @@
+import json
+import threading
+import urllib.request
+import pandas as pd
+import pytest
+import exman
+import exman.serve
+
+# fixtures:
+#   parser: exman.ExParser
+
+
+@pytest.fixture
+def server(parser):
+    server = exman.serve.make_server(parser.root, port=0)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield "http://{}:{}".format(*server.server_address)
+    server.shutdown()
+    server.server_close()
+
+
+def test_serve(parser: exman.ExParser, server, script_runner, root):
+    script_runner.launch_mode = "in_process"
+    parser.parse_args("--arg1=10 --arg2=F".split())
+    parser.parse_args("--arg1=9 --arg2=t".split())
+    with urllib.request.urlopen(server + "/runs?arg1=9") as response:
+        assert [r["id"] for r in json.loads(response.read().decode())] == ["2"]
+    index = exman.Index(parser.root, server=server)
+    pd.testing.assert_frame_equal(index.info(), exman.Index(parser.root).info())
+    etag = index.client._etag
+    pd.testing.assert_frame_equal(index.info(), exman.Index(parser.root).info())
+    assert index.client._etag == etag
+    parser.parse_args([])
+    assert script_runner.run("exman", "delete", "1", cwd=root).success
+    info = index.info()
+    assert info.id.tolist() == [2, 3]
+    pd.testing.assert_frame_equal(info, exman.Index(parser.root).info())
+
+
+def test_cached_info(parser: exman.ExParser):
+    parser.parse_args("--arg1=10 --arg2=F".split())
+    index = exman.Index(parser.root)
+    assert len(index.info(cached=True)) == 1
+    generation = index.generation
+    assert not index.refresh()
+    args = parser.parse_args("--arg1=9 --arg2=t".split())
+    with args.safe_experiment:
+        pass
+    info = index.info(cached=True)
+    assert index.generation == generation + 1
+    pd.testing.assert_frame_equal(info, exman.Index(parser.root).info())
+
+
+def test_serve_changed_status(parser: exman.ExParser, server):
+    args = parser.parse_args([])
+    index = exman.Index(parser.root, server=server)
+    with args.safe_experiment(profile=0.1):
+        assert index.info().status.tolist() == ["running"]
+    info = index.info()
+    assert info.status.tolist() == ["finished"]
+    assert "res_wall_time" in info.columns
+    pd.testing.assert_frame_equal(info, exman.Index(parser.root).info())
@@ -0,0 +1,83 @@
+import pathlib
+import pytest
+import exman
+from exman.storage import MemoryStorage
+
+
+@pytest.fixture
+def storage():
+    return MemoryStorage()
+
+
+@pytest.fixture
+def memroot(root):
+    # the path is never created on disk
+    return root / "memory"
+
+
+def test_memory_symlinks_and_moves(storage):
+    storage.makedirs("/a/runs/1")
+    storage.write_text("/a/runs/1/params.yaml", "x: 1\n")
+    storage.makedirs("/a/index")
+    storage.symlink("/a/index/1.yaml", "../runs/1/params.yaml")
+    assert storage.read_text("/a/index/1.yaml") == "x: 1\n"
+    assert storage.is_symlink("/a/index/1.yaml")
+    assert storage.resolve("/a/index/1.yaml") == pathlib.Path("/a/runs/1/params.yaml")
+    storage.makedirs("/a/fails")
+    storage.move("/a/runs/1", "/a/fails/1")
+    assert not storage.exists("/a/index/1.yaml")
+    assert storage.read_text("/a/fails/1/params.yaml") == "x: 1\n"
+    assert storage.listdir("/a/runs") == []
+    with pytest.raises(FileExistsError):
+        storage.mkdir("/a/fails/1")
+    with pytest.raises(FileNotFoundError):
+        storage.write_text("/b/params.yaml", "")
+
+
+def test_parser_and_index_in_memory(storage, memroot):
+    parser = exman.ExParser(root=memroot, storage=storage, automark=["arg"])
+    parser.add_argument("--arg", default=1, type=int)
+    args = parser.parse_args(["--arg", "2"])
+    with args.safe_experiment:
+        print("hello")
+    parser.parse_args(["--tmp"])
+    args = parser.parse_args([])
+    with pytest.raises(ValueError):
+        with args.safe_experiment:
+            raise ValueError
+    assert not memroot.exists()
+    assert parser.num_ex() == 1
+    assert parser.next_ex() == 4
+    index = exman.Index(memroot, storage=storage)
+    info = index.info()
+    assert info.id.tolist() == [1]
+    assert info.arg.tolist() == [2]
+    assert info.status.tolist() == ["finished"]
+    assert index.info("arg").id.tolist() == [1]
+    runs = index.list_runs(status=True)
+    assert runs.state.tolist() == ["run", "tmp", "fail"]
+    assert runs.status.tolist() == ["finished", None, "failed"]
+    assert index.read_log(1) == "hello\n"
+    assert index.read_file(1, exman.parser.LOG_FILE, binary=True) == b"hello\n"
+    assert "ValueError" in index.read_file(3, "traceback.txt")
+    # the failed run gets its index entry back on resume
+    resumed = parser.resume(3)
+    assert resumed.root == parser.runs / resumed.root.name
+    assert index.info(cached=True).id.tolist() == [1, 3]
+
+
+def test_git_diff_in_memory(storage, memroot, tmp_path):
+    import git
+
+    repo = git.Repo.init(tmp_path / "repo")
+    (tmp_path / "repo" / "file.txt").write_text("a")
+    repo.index.add(["file.txt"])
+    repo.index.commit("init")
+    (tmp_path / "repo" / "file.txt").write_text("b")
+    parser = exman.ExParser(root=memroot, storage=storage, git=str(tmp_path / "repo"))
+    args = parser.parse_args([])
+    assert "+b" in storage.read_text(args.root / exman.parser.DIFF_FILE)
+    assert exman.Index(memroot, storage=storage).info().id.tolist() == [1]
+    with pytest.raises(NotImplementedError):
+        args.safe_experiment.save_artifact(b"data", "data.bin")
+    assert not memroot.exists()